@@ -1,7 +1,5 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import io
-import sys
 import threading
 from ..core.environment import Environment
 from ..agents.random_agent import RandomAgent
@@ -29,19 +27,15 @@ class ButtonFunctions:
         # Get current percepts before action
         current_percepts = self.parent.env.get_percepts(self.parent.agent.x, self.parent.agent.y)
         
-        # Capture stdout to get agent's print messages
-        old_stdout = sys.stdout
-        sys.stdout = captured_output = io.StringIO()
+        # Collect the agent's action/decision events for this step
+        if self.parent.agent.trace_buffer is None:
+            self.parent.agent.enable_trace()
+        self.parent.agent.drain_events()
         
-        try:
-            # Execute agent step
-            continue_game = self.parent.agent.step()
-        finally:
-            # Restore stdout
-            sys.stdout = old_stdout
+        # Execute agent step
+        continue_game = self.parent.agent.step() or self.parent.agent.is_exiting()
         
-        # Get the captured output (agent's print messages)
-        agent_messages = captured_output.getvalue().strip()
+        agent_messages = "\n".join(event.message for event in self.parent.agent.drain_events())
         
         # Determine what action was taken by comparing states
         new_pos = (self.parent.agent.x, self.parent.agent.y)
@@ -519,43 +513,31 @@ class ButtonFunctions:
                     
                     # Run agent with step limit
                     max_steps = 500
-                    game_outcome = "Unknown"
-                    
-                    while test_agent.steps < max_steps and test_agent.alive:
-                        continue_game = test_agent.step()
-                        
-                        if not continue_game:
-                            if test_agent.has_gold and (test_agent.x, test_agent.y) == (0, 0):
-                                game_outcome = "Won with Gold"
-                            elif (test_agent.x, test_agent.y) == (0, 0):
-                                game_outcome = "Climbed out without Gold"
-                            else:
-                                game_outcome = "Quit Game"
-                            break
-                        
-                        if not test_agent.alive:
-                            game_outcome = "Died"
-                            break
-
-                    if test_agent.steps >= max_steps:
-                        game_outcome = "Timeout (500+ steps)"
+                    result = test_agent.run_episode(max_steps)
+                    game_outcome = {
+                        'won': "Won with Gold",
+                        'climbed_out': "Climbed out without Gold",
+                        'quit': "Quit Game",
+                        'died': "Died",
+                        'timeout': f"Timeout ({max_steps}+ steps)",
+                    }[result.outcome]
                     
                     # Store results
                     agent_results[agent_name] = {
-                        'steps': test_agent.steps,
-                        'score': test_agent.score,
+                        'steps': result.steps,
+                        'score': result.score,
                         'outcome': game_outcome,
-                        'has_gold': test_agent.has_gold,
-                        'alive': test_agent.alive,
-                        'can_shoot': test_agent.can_shoot
+                        'has_gold': result.has_gold,
+                        'alive': result.outcome != 'died',
+                        'can_shoot': result.arrows_used == 0
                     }
                     
                     # Display results
-                    update_ui(f"  Steps: {test_agent.steps}\n")
-                    update_ui(f"  Final Score: {test_agent.score}\n")
+                    update_ui(f"  Steps: {result.steps}\n")
+                    update_ui(f"  Final Score: {result.score}\n")
                     update_ui(f"  Outcome: {game_outcome}\n")
-                    update_ui(f"  Has Gold: {test_agent.has_gold}\n")
-                    update_ui(f"  Can shoot: {test_agent.can_shoot}\n\n")
+                    update_ui(f"  Has Gold: {result.has_gold}\n")
+                    update_ui(f"  Can shoot: {result.arrows_used == 0}\n\n")
                 
                 # Summary comparison
                 update_ui("=== COMPARISON SUMMARY ===\n\n")
@@ -91,32 +91,8 @@ class DrawUI:
         # Convert canvas_y back to world y for percept calculation
         world_y = (self.parent.height - 1 - canvas_y)
         
-        # Calculate percepts directly for this cell
-        percepts = {
-            'stench': False,
-            'breeze': False,
-            'glitter': False
-        }
-        
-        # Check for stench (adjacent to wumpus)
-        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            adj_x, adj_y = x + dx, world_y + dy
-            if 0 <= adj_x < self.parent.width and 0 <= adj_y < self.parent.height:
-                if self.parent.env.has_wumpus(adj_x, adj_y):
-                    percepts['stench'] = True
-                    break
-        
-        # Check for breeze (adjacent to pit)
-        for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            adj_x, adj_y = x + dx, world_y + dy
-            if 0 <= adj_x < self.parent.width and 0 <= adj_y < self.parent.height:
-                if self.parent.env.has_pit(adj_x, adj_y):
-                    percepts['breeze'] = True
-                    break
-        
-        # Check for glitter (gold in same cell)
-        if self.parent.env.has_gold(x, world_y):
-            percepts['glitter'] = True
+        # Percepts come precomputed from the environment
+        percepts = self.parent.env.get_percepts(x, world_y)
         
         # Calculate center position for percept indicators (using canvas coordinates)
         cell_x = x * self.parent.cell_size
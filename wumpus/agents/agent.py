@@ -1,10 +1,40 @@
 from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+import time
 from ..core.environment import Environment
-from ..config.settings import DIRECTIONS, DIRECTION_VECTORS
+from ..config.settings import DIRECTIONS, DIRECTION_VECTORS, GRAB_REWARD
+
+@dataclass
+class AgentEvent:
+    """One action or decision of an agent, as emitted to trace buffers and subscribers."""
+    kind: str          # turn_left, turn_right, move, bump, died, grab, climb, shoot, decision
+    step: int
+    pos: tuple
+    dir: str
+    message: str
+    data: dict = field(default_factory=dict)
+
+@dataclass
+class EpisodeResult:
+    """Summary of one Agent.run_episode call."""
+    outcome: str       # won, climbed_out, quit, died, timeout
+    score: int
+    steps: int
+    arrows_used: int
+    has_gold: bool
+    elapsed: float
+    phase_times: dict = field(default_factory=dict)  # seconds spent per phase of step()
+
 # Agent base class for Wumpus World
 # This class defines the basic structure and methods that all agents must implement.
 class Agent(ABC):
     def __init__(self, env: Environment):
+        # Event tracing, off by default: hot paths only test self.tracing
+        self.tracing = False
+        self.trace_buffer: deque | None = None
+        self._subscribers: list[Callable[[AgentEvent], None]] = []
         self.steps = 0
         self.env = env
         self.x, self.y = env.get_agent_pos()
@@ -13,21 +43,126 @@ class Agent(ABC):
         self.can_shoot = True
         self.alive = True
         self.score = 0
+        # Seconds per phase of step() this episode, agents that do not split their step leave it empty
+        self.phase_times: dict[str, float] = {}
         # Mark starting position as visited
         self.env.mark_visited(self.x, self.y)
 
+    def reset(self, env: Environment):
+        """Start a new episode on env, keeping trace settings and subscribers."""
+        self.steps = 0
+        self.env = env
+        self.x, self.y = env.get_agent_pos()
+        self.dir = env.get_agent_dir()
+        self.has_gold = False
+        self.can_shoot = True
+        self.alive = True
+        self.score = 0
+        self.phase_times.clear()
+        if self.trace_buffer is not None:
+            self.trace_buffer.clear()
+        self.env.mark_visited(self.x, self.y)
+
     @abstractmethod
     def step(self) -> bool:
         """Perform one step of the agent's action."""
         pass
 
+    def run_episode(self, max_steps: int = 500, on_event: Callable[[AgentEvent], None] = None) -> EpisodeResult:
+        """Step until the agent stops, dies or takes max_steps actions."""
+        if on_event is not None:
+            self.subscribe(on_event)
+        start = time.perf_counter()
+        running = True
+        step = self.step
+        try:
+            while (running or self.is_exiting()) and self.alive and self.steps < max_steps:
+                running = step()
+        finally:
+            if on_event is not None:
+                self.unsubscribe(on_event)
+        elapsed = time.perf_counter() - start
+
+        if not self.alive:
+            outcome = 'died'
+        elif running or self.is_exiting():
+            outcome = 'timeout'
+        elif (self.x, self.y) != (0, 0):
+            outcome = 'quit'
+        else:
+            outcome = 'won' if self.has_gold else 'climbed_out'
+        return EpisodeResult(outcome, self.score, self.steps, 0 if self.can_shoot else 1, self.has_gold,
+                             elapsed, dict(self.phase_times) or {'step': elapsed})
+
+    def is_exiting(self) -> bool:
+        """True while the agent stopped exploring but still has to walk out, run_episode keeps stepping it."""
+        return False
+
+    def snapshot(self) -> dict:
+        """
+        Cheap copy of the agent's own state. The environment is not included,
+        so restoring only rewinds what the agent believes, not the world.
+        """
+        return {
+            'steps': self.steps,
+            'pos': (self.x, self.y),
+            'dir': self.dir,
+            'has_gold': self.has_gold,
+            'can_shoot': self.can_shoot,
+            'alive': self.alive,
+            'score': self.score,
+        }
+
+    def restore(self, snap: dict):
+        self.steps = snap['steps']
+        self.x, self.y = snap['pos']
+        self.dir = snap['dir']
+        self.has_gold = snap['has_gold']
+        self.can_shoot = snap['can_shoot']
+        self.alive = snap['alive']
+        self.score = snap['score']
+
+    def enable_trace(self, buffer_size: int = 1024):
+        """Keep the last buffer_size events in trace_buffer."""
+        self.trace_buffer = deque(maxlen=buffer_size)
+        self.tracing = True
+
+    def disable_trace(self):
+        self.trace_buffer = None
+        self.tracing = bool(self._subscribers)
+
+    def subscribe(self, callback: Callable[[AgentEvent], None]):
+        self._subscribers.append(callback)
+        self.tracing = True
+
+    def unsubscribe(self, callback: Callable[[AgentEvent], None]):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+        self.tracing = self.trace_buffer is not None or bool(self._subscribers)
+
+    def drain_events(self) -> list[AgentEvent]:
+        if not self.trace_buffer:
+            return []
+        events = list(self.trace_buffer)
+        self.trace_buffer.clear()
+        return events
+
+    def emit(self, kind: str, message: str, **data):
+        """Callers guard with `if self.tracing:` so nothing is built when tracing is off."""
+        event = AgentEvent(kind, self.steps, (self.x, self.y), self.dir, message, data)
+        if self.trace_buffer is not None:
+            self.trace_buffer.append(event)
+        for callback in self._subscribers:
+            callback(event)
+
     def turn_left(self):
         self.steps += 1
         dirs = ['N', 'W', 'S', 'E']
         self.dir = dirs[(dirs.index(self.dir) + 1) % 4]
         self.env.set_agent_pos_and_dir(self.x, self.y, self.dir)
         self.score -= 1
-        print(f"Agent turned left to {self.dir}")
+        if self.tracing:
+            self.emit('turn_left', f"Agent turned left to {self.dir}")
 
     def turn_right(self):
         self.steps += 1
@@ -35,7 +170,8 @@ class Agent(ABC):
         self.dir = dirs[(dirs.index(self.dir) + 1) % 4]
         self.env.set_agent_pos_and_dir(self.x, self.y, self.dir)
         self.score -= 1
-        print(f"Agent turned right to {self.dir}")
+        if self.tracing:
+            self.emit('turn_right', f"Agent turned right to {self.dir}")
 
 
     def move_forward(self):
@@ -47,13 +183,16 @@ class Agent(ABC):
             self.x, self.y = nx, ny
             self.env.set_agent_pos_and_dir(self.x, self.y, self.dir)
             self.env.mark_visited(self.x, self.y)  # Mark new cell as visited
-            print(f"Agent moved to ({self.x}, {self.y}) facing {self.dir}")
+            if self.tracing:
+                self.emit('move', f"Agent moved to ({self.x}, {self.y}) facing {self.dir}")
             if self.env.has_pit(self.x, self.y) or self.env.has_wumpus(self.x, self.y):
-                print("Agent died!")
                 self.alive = False
                 self.score -= 1000
+                if self.tracing:
+                    self.emit('died', "Agent died!")
         else:
-            print("Bump!")
+            if self.tracing:
+                self.emit('bump', "Bump!")
     
     def move_to_pos(self, pos):
         pos_x, pos_y = pos
@@ -61,7 +200,8 @@ class Agent(ABC):
         dy = pos_y - self.y
         if (dx, dy) not in DIRECTION_VECTORS:
             if (dx, dy) == (0,0):
-                print("Same spot")
+                if self.tracing:
+                    self.emit('decision', "Same spot")
                 return
             else:
                 raise ValueError("Can only move to adjacent cell.")
@@ -81,30 +221,34 @@ class Agent(ABC):
     def grab_gold(self):
         self.steps += 1
         self.has_gold = True
-        self.score += 10
+        self.score += GRAB_REWARD
         self.env.grabbed_gold()
         self.env.set_safe(self.x, self.y)
-        print("Agent grabbed the gold!")
+        if self.tracing:
+            self.emit('grab', "Agent grabbed the gold!")
     
     def climb_out(self):
         self.steps += 1
         if self.has_gold:
             self.score += 1000
-            print("Agent climbed out with the gold!")
-        else:
-            print("Agent climbed out without gold.")
+        if self.tracing:
+            self.emit('climb', "Agent climbed out with the gold!" if self.has_gold else "Agent climbed out without gold.",
+                      has_gold=self.has_gold)
     
     def shoot(self):
         self.steps += 1
         if not self.can_shoot:
-            print("Agent cannot shoot again yet!")
+            if self.tracing:
+                self.emit('shoot', "Agent cannot shoot again yet!", fired=False, hit=False)
             return False
         self.score -= 10
         self.can_shoot = False
         
         if self.env.shot_wumpus():
-            print("Agent killed the Wumpus!")
+            if self.tracing:
+                self.emit('shoot', "Agent killed the Wumpus!", fired=True, hit=True)
             return True
         else:
-            print("Agent shot but missed.")
+            if self.tracing:
+                self.emit('shoot', "Agent shot but missed.", fired=True, hit=False)
             return False
@@ -1,32 +1,42 @@
 from ..agents.agent import Agent
 from ..ai.inference_engine import InferenceEngine, KnowledgeBase
+from ..ai.knowledge_base import load_kb_template
 from ..core.environment import Environment,Cell
 from ..ai.planning_module import PlanningModule
+from ..ai.expectimax import ExpectimaxModule
+from .phase_histogram import PhaseHistogram
 from heapdict import heapdict
-from ..config.settings import DIRECTIONS, DIRECTION_VECTORS
-import random
+from concurrent.futures import Executor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+import time
+from ..config.settings import DIRECTIONS
+
+_speculation_executor = None
+
+def _get_speculation_executor() -> Executor:
+    # one shared worker thread for every agent that does not bring its own executor
+    global _speculation_executor
+    if _speculation_executor is None:
+        _speculation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wumpus-speculation")
+    return _speculation_executor
+
+def speculate_probabilities(kb: KnowledgeBase, queries: list[str]) -> list[float]:
+    """Worker side of speculative inference, runs on a KB snapshot."""
+    return InferenceEngine(kb).model_check_probabilities(queries)
 
 class HybridAgent(Agent):
 
     def init_kb(self,kb: KnowledgeBase):
-        # init kb 
+        # init kb from the shared template, rules.txt/facts.txt are parsed once per process
         self.kb = kb
         try: 
-            # read rules from rules.txt    
-            with open("rules.txt", "r") as f:
-                rules = f.readlines()
-                for rule in rules:
-                    self.kb.add_rule(rule.strip())
-            with open("facts.txt", "r") as f:
-                facts = f.readlines()
-                for fact in facts:
-                    self.kb.add_fact(fact.strip())
+            self.kb.extend(load_kb_template())
         except Exception as e:
             print(f"Error initializing knowledge base: {e}")
         pass 
 
 
-    def __init__(self, env: Environment, kb: KnowledgeBase = None, ie: InferenceEngine = None, pm: PlanningModule = None, debug = False):
+    def __init__(self, env: Environment, kb: KnowledgeBase = None, ie: InferenceEngine = None, pm: PlanningModule = None, debug = False,
+                 speculative = False, executor: Executor = None, step_budget: float = None, lookahead = True):
         super().__init__(env)
         if kb is None:
             kb = KnowledgeBase()
@@ -36,6 +46,7 @@ class HybridAgent(Agent):
             pm = PlanningModule()
         
         self.init_kb(kb)
+        self._kb_start = self.kb.snapshot()
 
         self.debug = debug
         
@@ -47,6 +58,7 @@ class HybridAgent(Agent):
         self.aimed_wumpus = (-1, -1)
 
         self.visited = {(0, 0)}  # Start with the initial position as visited
+        self.pm.mark_visited((0, 0))
         self.x = 0
         self.y = 0
         self.route = []
@@ -56,6 +68,122 @@ class HybridAgent(Agent):
         self.pit_prob: dict[tuple, float] = {}
         self.cell_prob: dict[tuple, float] = {} # 0: safe 1: die
         self.uncertain_cell = heapdict()
+        # cell -> {"Wumpus", "Pit"} queries waiting for resolve_cell_probs
+        self.pending_probs: dict[tuple, set[str]] = {}
+        self.inference_calls = 0
+
+        # Speculative mode: resolve pending probabilities on a worker while walking a route
+        self.speculative = speculative
+        self.executor = executor
+        self._speculation = None  # (kb version, queries, future)
+        self.speculation_hits = 0
+        self.speculation_misses = 0
+
+        # Per-step latency budget in seconds, None means unlimited
+        self.step_budget = step_budget
+        self._deadline = None
+        self._degraded: list[str] = []
+        # Steps in a row spent retrying a cut search instead of giving up
+        self.max_held_steps = 8
+        self._held_steps = 0
+        self.last_step_report = None
+        self.deadlines_met = 0
+        self.deadlines_missed = 0
+        # Per-step phase durations, off unless enable_step_histogram() is called
+        self.step_histogram: PhaseHistogram | None = None
+
+        # Expectimax over the uncertain cells when forced to gamble, None for the greedy choice
+        self.lookahead = ExpectimaxModule() if lookahead else None
+
+    def reset(self, env: Environment):
+        """
+        Start a new episode on env. The KB is truncated back to the template and every
+        map, set and heap is cleared in place, so a pooled agent allocates nothing new.
+        """
+        super().reset(env)
+        self._drop_speculation()
+        self.kb.restore(self._kb_start)
+        self.ie.last_complete = True
+        self.pm.reset()
+
+        self.can_hunt = False
+        self.to_climbout = False
+        self.aimed_wumpus = (-1, -1)
+        self.visited.clear()
+        self.visited.add((0, 0))
+        self.pm.mark_visited((0, 0))
+        self.x = 0
+        self.y = 0
+        self.route = []
+
+        self.wumpus_at.clear()
+        self.wumpus_prob.clear()
+        self.pit_prob.clear()
+        self.cell_prob.clear()
+        self.uncertain_cell.clear()
+        self.pending_probs.clear()
+        self.inference_calls = 0
+        self.speculation_hits = 0
+        self.speculation_misses = 0
+        self._deadline = None
+        self._degraded.clear()
+        self._held_steps = 0
+        self.last_step_report = None
+        self.deadlines_met = 0
+        self.deadlines_missed = 0
+
+    def snapshot(self) -> dict:
+        """
+        KB and planner snapshots are marks into their append/undo logs, only the
+        small per-cell maps are copied. Restore to a snapshot taken on the current
+        line of history, e.g. to try a move and rewind before trying another.
+        """
+        snap = super().snapshot()
+        snap.update({
+            'kb': self.kb.snapshot(),
+            'pm': self.pm.snapshot(),
+            'can_hunt': self.can_hunt,
+            'to_climbout': self.to_climbout,
+            'aimed_wumpus': self.aimed_wumpus,
+            'route': self.route,
+            'visited': set(self.visited),
+            'wumpus_at': list(self.wumpus_at),
+            'wumpus_prob': dict(self.wumpus_prob),
+            'pit_prob': dict(self.pit_prob),
+            'cell_prob': dict(self.cell_prob),
+            'uncertain_cell': dict(self.uncertain_cell),
+            'pending_probs': {cell: set(kinds) for cell, kinds in self.pending_probs.items()},
+            'inference_calls': self.inference_calls,
+        })
+        return snap
+
+    def restore(self, snap: dict):
+        super().restore(snap)
+        self.kb.restore(snap['kb'])
+        self.pm.restore(snap['pm'])
+        # a speculation started after the snapshot may match the restored KB version by accident
+        self._drop_speculation()
+        self.can_hunt = snap['can_hunt']
+        self.to_climbout = snap['to_climbout']
+        self.aimed_wumpus = snap['aimed_wumpus']
+        self.route = snap['route']
+        # refill in place, the snapshot stays reusable
+        for name in ('visited', 'wumpus_prob', 'pit_prob', 'cell_prob'):
+            container = getattr(self, name)
+            container.clear()
+            container.update(snap[name])
+        self.wumpus_at[:] = snap['wumpus_at']
+        self.uncertain_cell.clear()
+        for cell, prob in snap['uncertain_cell'].items():
+            self.uncertain_cell[cell] = prob
+        self.pending_probs.clear()
+        for cell, kinds in snap['pending_probs'].items():
+            self.pending_probs[cell] = set(kinds)
+        self.inference_calls = snap['inference_calls']
+
+    def release(self, snap: dict):
+        """Done with snap, lets the planner stop its undo log if snap started it."""
+        self.pm.release(snap['pm'])
 
     def update_kb_and_cell_prob(self,percepts):
         n = self.env.get_size()
@@ -85,23 +213,6 @@ class HybridAgent(Agent):
             self.kb.add_fact(f"Stench({self.x}, {self.y})")
             wumpus_conditions = ' | '.join([f"Wumpus({cell[0]}, {cell[1]})" for cell in adj])
             self.kb.add_rule(f"Stench({self.x}, {self.y}) => {wumpus_conditions}")
-            wumpus_probs = {} 
-
-            # self.kb.represent_kb()
-
-            # Update wumpus probabilities
-            for cell in adj:
-                if cell in self.pm.space: 
-                    continue
-                if (cell not in self.cell_prob or 0 < self.cell_prob[cell] < 1):
-                    self.wumpus_prob[cell] = self.ie.model_check_probability(f"Wumpus({cell[0]}, {cell[1]})")
-                    wumpus_probs[cell] = self.wumpus_prob[cell]
-                    if self.wumpus_prob[cell] == 1:
-                        self.can_hunt = True
-                        if cell not in self.wumpus_at:
-                            self.wumpus_at.append(cell)
-            if self.debug:
-                print(f"[DEBUG] Stench detected at ({self.x}, {self.y}), updating Wumpus prob for cells: {[(cell, prob) for cell, prob in wumpus_probs.items()]}")
 
         if percepts["breeze"]:
             # Update KB with Breeze rule: Breeze(x, y) => Pit(adj_1) | Pit(adj_2) | ... 
@@ -109,20 +220,122 @@ class HybridAgent(Agent):
             pit_conditions = ' | '.join([f"Pit({cell[0]}, {cell[1]})" for cell in adj])
             self.kb.add_rule(f"Breeze({self.x}, {self.y}) => {pit_conditions}")
 
-            # Update pit probabilities
-            pit_probs = {}
+        # Probabilities are only computed once the agent runs out of safe cells, see resolve_cell_probs
+        if percepts["stench"] or percepts["breeze"]:
             for cell in adj:
-                if cell in self.pm.space: 
+                if cell in self.pm.space:
                     continue
-                if (cell not in self.cell_prob or 0 < self.cell_prob[cell] < 1):
-                    self.pit_prob[cell] = self.ie.model_check_probability(f"Pit({cell[0]}, {cell[1]})")
-                    pit_probs[cell] = self.pit_prob[cell]
-            if self.debug:
-                print(f"[DEBUG] Breeze detected at ({self.x}, {self.y}), updating Pit prob for cells: {[(cell, prob) for cell, prob in pit_probs.items()]}")
-
-
+                kinds = self.pending_probs.setdefault(cell, set())
+                if percepts["stench"]:
+                    kinds.add("Wumpus")
+                if percepts["breeze"]:
+                    kinds.add("Pit")
+
+    def _pending_queries(self, pending):
+        queries = []
+        for cell, kinds in pending.items():
+            if cell in self.pm.space:
+                continue
+            if not (cell not in self.cell_prob or 0 < self.cell_prob[cell] < 1):
+                continue
+            for kind in ("Wumpus", "Pit"):
+                if kind in kinds:
+                    queries.append((kind, cell))
+        return queries
+
+    def speculate(self):
+        """Start resolving the pending probabilities in the background on a KB snapshot."""
+        if not self.speculative or not self.pending_probs:
+            return
+        self._start_speculation()
+
+    def _start_speculation(self):
+        if self._speculation is not None and self._speculation[0] == self.kb.version:
+            return
+        self._drop_speculation()
+        queries = self._pending_queries(self.pending_probs)
+        if not queries:
+            return
+        executor = self.executor if self.executor is not None else _get_speculation_executor()
+        future = executor.submit(speculate_probabilities, self.kb.copy(),
+                                 [f"{kind}({cell[0]}, {cell[1]})" for kind, cell in queries])
+        self._speculation = (self.kb.version, queries, future)
+
+    def _drop_speculation(self):
+        if self._speculation is not None:
+            self._speculation[2].cancel()
+            self._speculation = None
+
+    def _take_speculation(self, queries):
+        """
+        Speculated probabilities for queries, or None if new percepts made them stale. Under a deadline
+        this waits for the worker only until the deadline and leaves an unfinished pass in self._speculation;
+        without one it blocks until the pass is done, as do the queries the pass did not cover.
+        """
+        if self._speculation is None:
+            return None
+        version, spec_queries, future = self._speculation
+        if version != self.kb.version or future.cancelled():
+            self._drop_speculation()
+            self.speculation_misses += 1
+            return None
+        timeout = None if self._deadline is None else max(self._deadline - time.perf_counter(), 0)
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            return None
+        except Exception as e:
+            self._speculation = None
+            if self.tracing:
+                self.emit('decision', f"Speculative inference failed: {e}", error=repr(e))
+            self.speculation_misses += 1
+            return None
+        self._speculation = None
+        spec_probs = dict(zip(spec_queries, result))
+        missing = [query for query in queries if query not in spec_probs]
+        if missing:
+            extra = self.ie.model_check_probabilities([f"{kind}({cell[0]}, {cell[1]})" for kind, cell in missing])
+            spec_probs.update(zip(missing, extra))
+        self.speculation_hits += 1
+        return [spec_probs[query] for query in queries]
+
+    def resolve_cell_probs(self):
+        """Run model checking for every cell touched by a breeze/stench since the last call."""
+        pending, self.pending_probs = self.pending_probs, {}
+        queries = self._pending_queries(pending)
+        probs = self._take_speculation(queries)
+        if probs is None and self._speculation is not None:
+            # the exact pass is still running on the worker, keep deciding on the cached probabilities
+            self._degraded.append("inference")
+            self._requeue_probs(pending)
+            return
+        if probs is None:
+            # One shared model enumeration for every pending query
+            probs = self.ie.model_check_probabilities([f"{kind}({cell[0]}, {cell[1]})" for kind, cell in queries],
+                                                      deadline=self._deadline)
+            if not self.ie.last_complete:
+                self._use_approximate_probs(pending, queries, probs)
+                return
+        self.inference_calls += len(queries)
+
+        wumpus_probs = {}
+        pit_probs = {}
+        for (kind, cell), prob in zip(queries, probs):
+            if kind == "Wumpus":
+                self.wumpus_prob[cell] = prob
+                wumpus_probs[cell] = prob
+                if prob == 1:
+                    self.can_hunt = True
+                    if cell not in self.wumpus_at:
+                        self.wumpus_at.append(cell)
+                        self.pm.add_wumpus(cell)
+            else:
+                self.pit_prob[cell] = prob
+                pit_probs[cell] = prob
+        if self.debug:
+            print(f"[DEBUG] Resolved Wumpus prob for cells: {list(wumpus_probs.items())}, Pit prob for cells: {list(pit_probs.items())}")
 
-        for cell in adj:
+        for cell in pending:
             if cell in self.pm.space:
                 continue
             if (cell in self.wumpus_prob and cell in self.pit_prob):
@@ -135,6 +348,27 @@ class HybridAgent(Agent):
                 self.pm.add_safe_cell(cell)
             if (cell in self.cell_prob and 0 < self.cell_prob[cell] < 1):
                 self.uncertain_cell[cell] = self.cell_prob[cell]
+            elif cell in self.uncertain_cell:
+                del self.uncertain_cell[cell]
+
+    def _use_approximate_probs(self, pending, queries, probs):
+        """
+        Out of time: rank uncertain cells by the partial estimates only.
+        Nothing is proven safe or deadly from them and the cells stay queued for an exact pass.
+        """
+        self._degraded.append("inference")
+        self._requeue_probs(pending)
+        survive = {}
+        for (kind, cell), prob in zip(queries, probs):
+            survive[cell] = survive.get(cell, 1) * (1 - prob)
+        for cell, alive in survive.items():
+            self.uncertain_cell[cell] = min(max(1 - alive, 0.01), 0.99)
+        if self.debug:
+            print(f"[DEBUG] Inference cut by deadline, approximate die prob: {[(cell, 1 - alive) for cell, alive in survive.items()]}")
+
+    def _requeue_probs(self, pending):
+        for cell, kinds in pending.items():
+            self.pending_probs.setdefault(cell, set()).update(kinds)
 
     def add_adj_as_safe_cell(self):
         n = self.env.get_size()
@@ -156,63 +390,52 @@ class HybridAgent(Agent):
 
     def get_nearest_notvisited_safe_cell_route(self):
         current_pos = (self.x, self.y)
-        candidates = [cell for cell in self.pm.space if cell not in self.visited]
-        if not candidates:
-            return None, None
-
-        goal, path = self.pm.get_nearest_goal_route(current_pos, candidates, self.dir)
+        goal, path = self.pm.get_nearest_frontier_route(current_pos, self.dir, deadline=self._deadline)
+        self._check_search_complete()
         if (goal != (-1, -1)):
             return goal, path
+        if not self.pm.last_search_complete:
+            return self._greedy_frontier_step()
+        return None, None
+
+    def _greedy_frontier_step(self):
+        """
+        One safe step towards the closest frontier cell (Manhattan distance) when the deadline cut
+        the search short. Every such step strictly shortens that distance, so they never cycle.
+        """
+        if not self.pm.frontier:
+            return None, None
+        x, y = self.x, self.y
+        goal = min(self.pm.frontier, key=lambda cell: (abs(cell[0] - x) + abs(cell[1] - y), cell))
+        distance = abs(goal[0] - x) + abs(goal[1] - y)
+        for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if cell in self.pm.space and abs(goal[0] - cell[0]) + abs(goal[1] - cell[1]) < distance:
+                return goal, [cell]
         return None, None
     
     def get_aimed_wumpus(self, is_at):
-        x, y = is_at
-        for wx, wy in self.wumpus_at:
-            if x == wx and y != wy:
-                return (wx, wy)
-            if y == wy and x != wx:
-                return (wx, wy)
-        return None
+        return self.pm.firing_positions.get(is_at)
 
     def find_shoot_path(self):
         current_pos = (self.x, self.y)
-        shoot_candidates = []
-        n = self.env.get_size()
+        # wumpus_at may have been filled in directly, keep the planner index in sync
         for wumpus in self.wumpus_at:
-            wx, wy = wumpus
-            for x in range(n):  
-                if (x, wy) in self.pm.space and (x, wy) != wumpus:
-                    shoot_candidates.append((x,wy))
-
-            for y in range(n):
-                if (wx, y) in self.pm.space and (wx, y) != wumpus:
-                    shoot_candidates.append((wx,y))
-        goal, path = self.pm.get_nearest_goal_route(current_pos, shoot_candidates, self.dir)
+            self.pm.add_wumpus(wumpus)
+        goal, path, wumpus, _ = self.pm.get_nearest_shoot_route(current_pos, self.dir, deadline=self._deadline)
+        self._check_search_complete()
         if (goal != (-1, -1)):
-            self.aimed_wumpus = self.get_aimed_wumpus(goal)
-            print(goal)
-            print(f"Hunt path: {path}")
+            self.aimed_wumpus = wumpus
+            if self.tracing:
+                self.emit('decision', f"Hunt path to {goal}: {path}", goal=goal, route=path, wumpus=wumpus)
             return path
         return None
 
     def turn_to_shoot_dir(self):
-        wx, wy = self.aimed_wumpus
-        ax, ay = self.x, self.y
-
-        if ax == wx:
-            if wy > ay:
-                target_dir = 'S'
-            else:
-                target_dir = 'N'
-        elif ay == wy:
-            if wx > ax:
-                target_dir = 'E'
-            else:
-                target_dir = 'W'
-        else:
+        target_dir = self.pm.get_shoot_dir((self.x, self.y), self.aimed_wumpus)
+        if target_dir is None:
             return False
-        print(f"Turn to shoot direction: {target_dir}")
-        print(f"Current direction: {self.dir}") 
+        if self.tracing:
+            self.emit('decision', f"Turn to shoot direction: {target_dir}", target_dir=target_dir)
         current_idx = DIRECTIONS.index(self.dir)
         target_idx = DIRECTIONS.index(target_dir)
         diff = (target_idx - current_idx) % 4
@@ -227,7 +450,143 @@ class HybridAgent(Agent):
         return True
 
 
+    def _check_search_complete(self):
+        if not self.pm.last_search_complete:
+            self._degraded.append("planning")
+
+    def _lap(self, phase, since):
+        """Charge the time since `since` to phase, returns now for the next lap."""
+        now = time.perf_counter()
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + now - since
+        return now
+
+    def enable_step_histogram(self, histogram: PhaseHistogram = None) -> PhaseHistogram:
+        """
+        Record every step's phases (percepts, kb_update, frontier, inference, planning, act)
+        and its total ('step') into histogram, which may be shared between agents.
+        """
+        self.step_histogram = histogram if histogram is not None else PhaseHistogram()
+        return self.step_histogram
+
     def step(self):
+        """One action, timed against step_budget; see last_step_report."""
+        start = time.perf_counter()
+        self._deadline = start + self.step_budget if self.step_budget is not None else None
+        self._degraded = []
+        lapped = sum(self.phase_times.values())
+        histogram = self.step_histogram
+        if histogram is not None:
+            before = dict(self.phase_times)
+        try:
+            return self._step()
+        finally:
+            elapsed = time.perf_counter() - start
+            # whatever _step did not lap itself is acting on the environment
+            self.phase_times['act'] = self.phase_times.get('act', 0.0) + elapsed - (sum(self.phase_times.values()) - lapped)
+            if histogram is not None:
+                for phase, total in self.phase_times.items():
+                    if total != before.get(phase):
+                        histogram.add(phase, total - before.get(phase, 0.0))
+                histogram.add('step', elapsed)
+            met = self.step_budget is None or elapsed <= self.step_budget
+            if met:
+                self.deadlines_met += 1
+            else:
+                self.deadlines_missed += 1
+            self.last_step_report = {
+                'elapsed': elapsed,
+                'budget': self.step_budget,
+                'deadline_met': met,
+                'degraded': self._degraded,
+            }
+            self._deadline = None
+
+    def _choose_route(self, lap):
+        """
+        Fill self.route when it ran out: the next safe cell, a hunt or a gamble. Returns True or
+        False when the step already acted (a shot), None when the caller should walk the route.
+        """
+        if (self.aimed_wumpus != (-1, -1)):
+            if self.tracing:
+                self.emit('decision', f"Aimed Wumpus at {self.aimed_wumpus}. Turning to shoot direction.", wumpus=self.aimed_wumpus)
+            shoot = self.turn_to_shoot_dir()
+            if not shoot and self.tracing:
+                self.emit('decision', f"Not in line with Wumpus at {self.aimed_wumpus}, shooting anyway", wumpus=self.aimed_wumpus)
+            wumpus_die = self.shoot()
+            if wumpus_die:
+                if self.debug:
+                    print(f"[DEBUG] Wumpus at {self.aimed_wumpus} killed. Updating KB and probabilities.")
+                self.wumpus_at.remove(self.aimed_wumpus)
+                self.pm.remove_wumpus(self.aimed_wumpus)
+                self.wumpus_prob[self.aimed_wumpus] = 0
+                self.cell_prob[self.aimed_wumpus] = 0
+                self.kb.add_fact(f"!Wumpus({self.x}, {self.y})")
+                self.pm.add_safe_cell(self.aimed_wumpus)
+            self.aimed_wumpus = (-1, -1)
+            return True
+        safe_nv_cell, safe_nv_route = self.get_nearest_notvisited_safe_cell_route()
+        lap = self._lap('frontier', lap)
+        if safe_nv_cell is None and self.pending_probs:
+            # Out of known safe cells, only now the probabilities are worth computing
+            self.resolve_cell_probs()
+            lap = self._lap('inference', lap)
+            safe_nv_cell, safe_nv_route = self.get_nearest_notvisited_safe_cell_route()
+            lap = self._lap('frontier', lap)
+        if safe_nv_cell is not None:
+            self.route = safe_nv_route
+            if self.debug:
+                print(f"[DEBUG] Nearest not visited safe cell: {safe_nv_cell}. Advancing there, found route: {self.route}.")
+        elif self.can_hunt and self.can_shoot:
+            if self.debug:
+                print("[DEBUG] Can hunt and shoot. Finding shoot path.")
+            hunt_plan = self.find_shoot_path()
+            if hunt_plan is not None:
+                if self.debug:
+                    print(f"Found hunt path. Moving to hunt spot: {hunt_plan}")
+                if (len(hunt_plan) == 0):
+                    return True
+                self.route = hunt_plan
+        else:
+            # under a cut inference pass the uncertain cells hold its approximate probabilities
+            if self.debug:  
+                print(f"[DEBUG] Uncertain cells: {self.uncertain_cell.heap}")
+            if self.lookahead is not None:
+                goal, result, die_prob = self.lookahead.choose(self)
+                if result is None and self.tracing:
+                    self.emit('decision', f"No gamble worth taking (best value {self.lookahead.last_value}), giving up",
+                              value=self.lookahead.last_value)
+            else:
+                goal, result, die_prob = self.pm.get_risky_route((self.x, self.y), self.uncertain_cell, self.dir, max_risk=0.8,
+                                                                  deadline=self._deadline)
+                self._check_search_complete()
+            if result is not None:
+                self.route = result
+                if self.tracing:
+                    self.emit('decision', f"Risking uncertain cell {goal} with die_prob {die_prob:.2f}, route: {result}",
+                              goal=goal, route=result, die_prob=die_prob)
+        self._lap('planning', lap)
+        return None
+
+    def _hold(self):
+        """
+        Whether to spend this step waiting rather than give up on a decision the deadline cut short.
+        A cut inference pass is finished exactly on the worker, the next steps only wait for it until
+        their own deadline. A cut search is retried on the next step, at most max_held_steps in a row.
+        """
+        if "inference" in self._degraded:
+            self._start_speculation()
+            if self._speculation is not None:
+                if self.tracing:
+                    self.emit('decision', "Inference cut by the deadline, holding until the exact pass is done")
+                return True
+        if self._held_steps >= self.max_held_steps:
+            return False
+        self._held_steps += 1
+        if self.tracing:
+            self.emit('decision', f"Search cut by the deadline, holding ({self._held_steps}/{self.max_held_steps})")
+        return True
+
+    def _step(self):
         if not self.alive:
             if self.debug:
                 print("[DEBUG] Agent is not alive. Returning False.")
@@ -236,6 +595,7 @@ class HybridAgent(Agent):
             if self.debug:
                 print("[DEBUG] Agent is ready to climb out.")
             self.climb_out()
+            self.to_climbout = False
             return False
         cur_pos = (self.x,self.y)
         self.cell_prob[cur_pos] = 0
@@ -243,12 +603,16 @@ class HybridAgent(Agent):
             del self.uncertain_cell[cur_pos]
 
         self.pm.add_safe_cell(cur_pos)
+        lap = time.perf_counter()
         percepts = self.env.get_percepts(self.x, self.y)
+        lap = self._lap('percepts', lap)
         if percepts["glitter"]:
             if self.debug:
                 print("[DEBUG] Glitter detected. Grabbing gold and planning route to exit.")
             self.grab_gold()
-            self.route,_ = self.pm.find_route((self.x, self.y),(0,0),self.dir)
+            lap = self._lap('act', lap)
+            self.route,_ = self.pm.route_to_exit((self.x, self.y), self.dir)
+            lap = self._lap('planning', lap)
         if self.has_gold and self.x == 0 and self.y == 0: # has gold and at exit
             self.climb_out()
             if self.debug:
@@ -265,55 +629,15 @@ class HybridAgent(Agent):
             # self.kb.represent_kb()
         
         self.update_kb_and_cell_prob(percepts)
+        lap = self._lap('kb_update', lap)
 
         if len(self.route) == 0:
-            if (self.aimed_wumpus != (-1, -1)):
-                # if self.debug:
-                print(f"[DEBUG] Aimed Wumpus at {self.aimed_wumpus}. Turning to shoot direction.")
-                shoot = self.turn_to_shoot_dir()
-                if not shoot:
-                    print("Tinh sai vi tri ban roi m")
-                wumpus_die = self.shoot()
-                if wumpus_die:
-                    if self.debug:
-                        print(f"[DEBUG] Wumpus at {self.aimed_wumpus} killed. Updating KB and probabilities.")
-                    self.wumpus_at.remove(self.aimed_wumpus)
-                    self.wumpus_prob[self.aimed_wumpus] = 0
-                    self.cell_prob[self.aimed_wumpus] = 0
-                    self.kb.add_fact(f"!Wumpus({self.x}, {self.y})")
-                    self.pm.add_safe_cell(self.aimed_wumpus)
-                self.aimed_wumpus = (-1, -1)
+            acted = self._choose_route(lap)
+            if acted is None and not self.route and self._degraded and self._hold():
                 return True
-            safe_nv_cell, safe_nv_route = self.get_nearest_notvisited_safe_cell_route()
-            if safe_nv_cell is not None:
-                self.route = safe_nv_route
-                if self.debug:
-                    print(f"[DEBUG] Nearest not visited safe cell: {safe_nv_cell}. Advancing there, found route: {self.route}.")
-            elif self.can_hunt and self.can_shoot:
-                if self.debug:
-                    print("[DEBUG] Can hunt and shoot. Finding shoot path.")
-                hunt_plan = self.find_shoot_path()
-                if hunt_plan is not None:
-                    if self.debug:
-                        print(f"Found hunt path. Moving to hunt spot: {hunt_plan}")
-                    if (len(hunt_plan) == 0):
-                        return True
-                    self.route = hunt_plan
-            else:
-                if self.debug:  
-                    print(f"[DEBUG] Uncertain cells: {self.uncertain_cell.heap}")
-                goal, die_prob = self.uncertain_cell.popitem()
-                if self.debug:
-                    print(f"[DEBUG] No safe route. Popping cell {goal} with die_prob {die_prob}.")
-                if (die_prob < 0.8):
-                    # same_die_prob = [cell for cell, prob in self.uncertain_cell.items() if prob == die_prob]
-                    # same_die_prob.append(goal)
-                    # if len(same_die_prob) > 1:
-                    #     goal = random.choice(same_die_prob)
-                    self.pm.space.add(goal)
-                    result,_ = self.pm.find_route((self.x, self.y),goal, self.dir)
-                    self.route = result
-                    print(f"[DEBUG] Start: {(self.x, self.y)} Found route to uncertain cell {goal}: {result}.")
+            self._held_steps = 0
+            if acted is not None:
+                return acted
         else:
             if self.debug:
                 print(f"[DEBUG] Route available: {self.route}. Moving to next position.")
@@ -324,18 +648,26 @@ class HybridAgent(Agent):
                 print(f"[DEBUG] Moving to position {self.route[0]}. Marking as visited.")
             self.move_to_pos(self.route[0])
             self.visited.add(self.route[0])
+            self.pm.mark_visited(self.route[0])
             self.route = self.route[1:]
+            if self.route:
+                self.speculate()
             if self.debug:
                 print("[DEBUG] Step completed. Returning True.")
             return True
         else:
-            self.route,_ = self.pm.find_route((self.x, self.y),(0,0),self.dir)
-            self.to_climbout = True
+            route, _ = self.pm.route_to_exit((self.x, self.y), self.dir)
+            # with no way back the agent quits where it stands
+            self.route = route or []
+            self.to_climbout = route is not None
             if self.debug:
                 print("[DEBUG] No route available. Climbing out.")
             
             return False
 
+    def is_exiting(self):
+        return self.to_climbout
+
 
 if __name__ == "__main__":
     pass
\ No newline at end of file
@@ -0,0 +1,193 @@
+import numpy as np
+
+# Planes of ObservationEncoder.planes, one N x N grid each, indexed [slot, channel, y, x]
+CHANNELS = ('visited', 'safe', 'known', 'cell_prob', 'wumpus_prob', 'pit_prob', 'stench', 'breeze', 'glitter', 'agent')
+VISITED, SAFE, KNOWN, CELL_PROB, WUMPUS_PROB, PIT_PROB, STENCH, BREEZE, GLITTER, AGENT = range(len(CHANNELS))
+# Entries of ObservationEncoder.pose, indexed [slot, feature]
+POSE = ('x', 'y', 'N', 'E', 'S', 'W', 'has_gold', 'can_shoot', 'alive')
+_HEADING = {'N': 2, 'E': 3, 'S': 4, 'W': 5}
+
+
+class _TrackedDict(dict):
+    """dict that adds every key it writes or drops to a shared dirty set."""
+    __slots__ = ('dirty',)
+
+    def __init__(self, data, dirty):
+        super().__init__(data)
+        self.dirty = dirty
+
+    def __setitem__(self, key, value):
+        self.dirty.add(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.dirty.add(key)
+        dict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        self.dirty.add(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self.dirty.add(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        self.dirty.add(key)
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        other = dict(*args, **kwargs)
+        self.dirty.update(other)
+        dict.update(self, other)
+
+    def clear(self):
+        self.dirty.update(self)
+        dict.clear(self)
+
+
+class _TrackedSet(set):
+    """set that adds every item it gains or loses to a shared dirty set."""
+    __slots__ = ('dirty',)
+
+    def __init__(self, data, dirty):
+        super().__init__(data)
+        self.dirty = dirty
+
+    def add(self, item):
+        self.dirty.add(item)
+        set.add(self, item)
+
+    def discard(self, item):
+        self.dirty.add(item)
+        set.discard(self, item)
+
+    def remove(self, item):
+        self.dirty.add(item)
+        set.remove(self, item)
+
+    def pop(self):
+        item = set.pop(self)
+        self.dirty.add(item)
+        return item
+
+    def update(self, *others):
+        for other in others:
+            other = set(other)
+            self.dirty.update(other)
+            set.update(self, other)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def difference_update(self, *others):
+        for other in others:
+            other = set(other)
+            self.dirty.update(other)
+            set.difference_update(self, other)
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def clear(self):
+        self.dirty.update(self)
+        set.clear(self)
+
+
+class ObservationEncoder:
+    """
+    Fixed-shape float32 tensors of what B HybridAgents know, for learned value functions.
+
+    attach() swaps the agent's visited, probability maps and planner space for tracking
+    versions that note every cell they touch. encode() then only rewrites those cells and
+    the pose, no matter how much of the grid is known. Stored percepts are read from the
+    environment when a cell's visited flag changes, which is when the environment stores them.
+    Attach before the episode starts (or right after reset): snapshots taken earlier still
+    refer to the untracked containers. Cells outside the N x N window are not encoded.
+    """
+
+    def __init__(self, N, batch_size=1):
+        self.N = N
+        self.planes = np.zeros((batch_size, len(CHANNELS), N, N), dtype=np.float32)
+        self.pose = np.zeros((batch_size, len(POSE)), dtype=np.float32)
+        self.agents = [None] * batch_size
+        self._dirty: list[set] = [set() for _ in range(batch_size)]
+        self._agent_cell = [None] * batch_size
+
+    def attach(self, agent, slot=0):
+        dirty = self._dirty[slot]
+        dirty.clear()
+        for name in ('visited', 'cell_prob', 'wumpus_prob', 'pit_prob'):
+            setattr(agent, name, (_TrackedSet if name == 'visited' else _TrackedDict)(getattr(agent, name), dirty))
+        agent.pm.space = _TrackedSet(agent.pm.space, dirty)
+        self.agents[slot] = agent
+        self.planes[slot] = 0
+        self._agent_cell[slot] = None
+        # everything known so far is new to this slot
+        dirty.update(agent.visited, agent.cell_prob, agent.wumpus_prob, agent.pit_prob, agent.pm.space)
+
+    def encode(self):
+        """Bring every attached slot up to date, returns (planes, pose) without copying."""
+        for slot, agent in enumerate(self.agents):
+            if agent is not None:
+                self._encode(slot, agent)
+        return self.planes, self.pose
+
+    def _encode(self, slot, agent):
+        N = self.N
+        planes = self.planes[slot]
+        dirty = self._dirty[slot]
+        if dirty:
+            cells = [(x, y) for x, y in dirty if 0 <= x < N and 0 <= y < N]
+            dirty.clear()
+            xs = [x for x, _ in cells]
+            ys = [y for _, y in cells]
+            visited, space, env = agent.visited, agent.pm.space, agent.env
+            cell_prob, wumpus_prob, pit_prob = agent.cell_prob, agent.wumpus_prob, agent.pit_prob
+            percepts = [env.get_cell_percepts(*cell) for cell in cells]
+            planes[VISITED, ys, xs] = [cell in visited for cell in cells]
+            planes[SAFE, ys, xs] = [cell in space for cell in cells]
+            planes[KNOWN, ys, xs] = [cell in cell_prob for cell in cells]
+            planes[CELL_PROB, ys, xs] = [cell_prob.get(cell) or 0.0 for cell in cells]
+            planes[WUMPUS_PROB, ys, xs] = [wumpus_prob.get(cell) or 0.0 for cell in cells]
+            planes[PIT_PROB, ys, xs] = [pit_prob.get(cell) or 0.0 for cell in cells]
+            planes[STENCH, ys, xs] = [p['stench'] for p in percepts]
+            planes[BREEZE, ys, xs] = [p['breeze'] for p in percepts]
+            planes[GLITTER, ys, xs] = [p['glitter'] for p in percepts]
+
+        cell = (agent.x, agent.y)
+        if cell != self._agent_cell[slot]:
+            if self._agent_cell[slot] is not None:
+                planes[AGENT, self._agent_cell[slot][1], self._agent_cell[slot][0]] = 0
+            if 0 <= agent.x < N and 0 <= agent.y < N:
+                planes[AGENT, agent.y, agent.x] = 1
+            self._agent_cell[slot] = cell
+        pose = self.pose[slot]
+        pose[:] = 0
+        pose[0], pose[1] = agent.x, agent.y
+        pose[_HEADING[agent.dir]] = 1
+        pose[6], pose[7], pose[8] = agent.has_gold, agent.can_shoot, agent.alive
+
+    def encode_full(self, agent):
+        """Rebuild one agent's (planes, pose) from scratch, the reference encode() must agree with."""
+        N = self.N
+        planes = np.zeros((len(CHANNELS), N, N), dtype=np.float32)
+        for y in range(N):
+            for x in range(N):
+                cell = (x, y)
+                percepts = agent.env.get_cell_percepts(x, y)
+                planes[:AGENT, y, x] = (
+                    cell in agent.visited, cell in agent.pm.space, cell in agent.cell_prob,
+                    agent.cell_prob.get(cell) or 0.0, agent.wumpus_prob.get(cell) or 0.0, agent.pit_prob.get(cell) or 0.0,
+                    percepts['stench'], percepts['breeze'], percepts['glitter'],
+                )
+        if 0 <= agent.x < N and 0 <= agent.y < N:
+            planes[AGENT, agent.y, agent.x] = 1
+        pose = np.zeros(len(POSE), dtype=np.float32)
+        pose[0], pose[1] = agent.x, agent.y
+        pose[_HEADING[agent.dir]] = 1
+        pose[6], pose[7], pose[8] = agent.has_gold, agent.can_shoot, agent.alive
+        return planes, pose
@@ -0,0 +1,88 @@
+from bisect import bisect_left
+import json
+
+# Upper bucket edges in seconds, 1-2-5 steps from 1us to 10s; one more bucket catches anything slower
+BUCKET_BOUNDS = tuple(m * 10.0 ** e for e in range(-6, 1) for m in (1, 2, 5)) + (10.0,)
+
+
+class PhaseHistogram:
+    """
+    Fixed-bucket histograms of per-step phase durations, cheap enough to leave on for
+    thousands of episodes. One instance can be shared by many agents or merged afterwards.
+    """
+
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts: dict[str, list[int]] = {}
+        self.totals: dict[str, float] = {}
+        self.maxima: dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float):
+        counts = self.counts.get(phase)
+        if counts is None:
+            counts = self.counts[phase] = [0] * (len(self.bounds) + 1)
+            self.totals[phase] = 0.0
+            self.maxima[phase] = 0.0
+        counts[bisect_left(self.bounds, seconds)] += 1
+        self.totals[phase] += seconds
+        if seconds > self.maxima[phase]:
+            self.maxima[phase] = seconds
+
+    def add_step(self, phases: dict[str, float]):
+        for phase, seconds in phases.items():
+            self.add(phase, seconds)
+
+    def merge(self, other: "PhaseHistogram"):
+        if other.bounds != self.bounds:
+            raise ValueError("cannot merge histograms with different buckets")
+        for phase, counts in other.counts.items():
+            if phase not in self.counts:
+                self.counts[phase] = [0] * (len(self.bounds) + 1)
+                self.totals[phase] = 0.0
+                self.maxima[phase] = 0.0
+            self.counts[phase] = [a + b for a, b in zip(self.counts[phase], counts)]
+            self.totals[phase] += other.totals[phase]
+            self.maxima[phase] = max(self.maxima[phase], other.maxima[phase])
+
+    def count(self, phase: str) -> int:
+        return sum(self.counts.get(phase, ()))
+
+    def percentile(self, phase: str, q: float) -> float:
+        """Upper edge of the bucket holding the q-th percentile (0-100), the maximum for the overflow bucket."""
+        total = self.count(phase)
+        if total == 0:
+            return 0.0
+        rank = q / 100 * total
+        seen = 0
+        for i, n in enumerate(self.counts[phase]):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else self.maxima[phase]
+        return self.maxima[phase]
+
+    def to_dict(self) -> dict:
+        return {
+            'bounds': list(self.bounds),
+            'phases': {
+                phase: {
+                    'counts': counts,
+                    'total': self.totals[phase],
+                    'max': self.maxima[phase],
+                    'p50': self.percentile(phase, 50),
+                    'p99': self.percentile(phase, 99),
+                }
+                for phase, counts in self.counts.items()
+            },
+        }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PhaseHistogram":
+        histogram = cls(data['bounds'])
+        for phase, entry in data['phases'].items():
+            histogram.counts[phase] = list(entry['counts'])
+            histogram.totals[phase] = entry['total']
+            histogram.maxima[phase] = entry['max']
+        return histogram
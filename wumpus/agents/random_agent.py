@@ -8,6 +8,9 @@ class RandomAgent(Agent):
     def __init__(self, env):
         super().__init__(env)
         self.is_turn = False
+    def reset(self, env):
+        super().reset(env)
+        self.is_turn = False
     def step(self):
         if not self.alive:
             return False
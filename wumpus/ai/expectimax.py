@@ -0,0 +1,199 @@
+import time
+from ..config.settings import (DEATH_PENALTY, GOLD_REWARD, ARROW_COST, MOVE_COST,
+                               DEFAULT_PIT_PROBABILITY, DEFAULT_WUMPUS_COUNT)
+
+
+class ExpectimaxModule:
+    """
+    Bounded-depth expectimax over the uncertain cells a HybridAgent may gamble on.
+
+    Decision nodes pick a risky cell or give up (value 0). Chance nodes die with the cell's
+    die probability or survive and observe one of the four stench/breeze outcomes, whose
+    likelihood comes from one batched model check of the cell's neighbours. Each outcome is
+    played on the agent itself between snapshot() and restore(); its value is the expected
+    gold behind the newly safe cells, or a deeper decision if nothing became safe.
+    Surviving is worth at most GOLD_REWARD, so a cell whose bound cannot beat the best
+    option so far is skipped without model checking.
+    """
+
+    def __init__(self, depth=2, branching=3, max_nodes=12, max_risk=0.8,
+                 pit_prior=DEFAULT_PIT_PROBABILITY, wumpus_count=DEFAULT_WUMPUS_COUNT):
+        self.depth = depth
+        self.branching = branching    # risky cells considered per decision node
+        self.max_nodes = max_nodes    # chance nodes expanded per decision, each costs model checks
+        self.max_risk = max_risk
+        # Priors for neighbours no percept has said anything about yet
+        self.pit_prior = pit_prior
+        self.wumpus_count = wumpus_count
+        self.nodes = 0
+        self.last_value = None
+        self._memo: dict[tuple, float] = {}
+        self._cell_value = 0.0
+        self._root_frontier = 0
+        self._deadline = None
+
+    def choose(self, agent):
+        """Best risky move for agent: (goal, route, die_prob), or ((-1, -1), None, None) to give up."""
+        candidates = self._candidates(agent)
+        if not candidates:
+            return (-1, -1), None, None
+        n = agent.env.get_size()
+        self.nodes = 0
+        self._memo = {}
+        self._deadline = agent._deadline
+        # Gold is equally likely behind any cell the agent has not stepped on
+        self._cell_value = GOLD_REWARD / max(1, n * n - len(agent.visited))
+        self._root_frontier = len(agent.pm.frontier)
+
+        root = agent.snapshot()
+        speculation, agent._speculation = agent._speculation, None
+        degraded, agent._degraded = agent._degraded, []
+        debug, agent.debug = agent.debug, False
+        best = (0.0, None, None, None)  # giving up and heading home
+        try:
+            for cell, die_prob, route in candidates:
+                if self._upper_bound(die_prob, route) <= best[0]:
+                    continue
+                value = self._chance_value(agent, cell, die_prob, self.depth, ()) + len(route) * MOVE_COST
+                if value > best[0]:
+                    best = (value, cell, route, die_prob)
+        finally:
+            agent.restore(root)
+            agent.release(root)
+            agent._speculation = speculation
+            agent._degraded = degraded
+            agent.debug = debug
+
+        self.last_value = best[0]
+        if best[1] is None:
+            return (-1, -1), None, None
+        return best[1], best[2], best[3]
+
+    def _upper_bound(self, die_prob, route):
+        return die_prob * DEATH_PENALTY + (1 - die_prob) * GOLD_REWARD + len(route) * MOVE_COST
+
+    def _candidates(self, agent):
+        """The `branching` least risky reachable cells, with the safe route into each."""
+        start = (agent.x, agent.y)
+        ranked = sorted(
+            (prob, cell) for cell, prob in agent.uncertain_cell.items()
+            if prob < self.max_risk and cell not in agent.pm.space
+        )
+        candidates = []
+        for prob, cell in ranked:
+            _, route, _ = agent.pm.get_risky_route(start, {cell: prob}, agent.dir)
+            if route is not None:
+                candidates.append((cell, prob, route))
+                if len(candidates) == self.branching:
+                    break
+        return candidates
+
+    def _out_of_budget(self):
+        return self.nodes >= self.max_nodes or (self._deadline is not None and time.perf_counter() > self._deadline)
+
+    def _decision_value(self, agent, depth, history):
+        key = (history, depth)
+        if key in self._memo:
+            return self._memo[key]
+        best = 0.0  # giving up and heading home
+        for cell, die_prob, route in self._candidates(agent):
+            if self._upper_bound(die_prob, route) <= best:
+                continue
+            value = self._chance_value(agent, cell, die_prob, depth, history) + len(route) * MOVE_COST
+            best = max(best, value)
+        self._memo[key] = best
+        return best
+
+    def _chance_value(self, agent, cell, die_prob, depth, history):
+        key = (history, cell, depth)
+        if key in self._memo:
+            return self._memo[key]
+        if self._out_of_budget():
+            # not expanded: score it from the priors, running out of budget must not read as giving up
+            survive = self._prior_value(agent, cell)
+        else:
+            survive = 0.0
+            self.nodes += 1
+            snap = agent.snapshot()
+            try:
+                agent.kb.add_fact(f"!Pit({cell[0]}, {cell[1]})")
+                agent.kb.add_fact(f"!Wumpus({cell[0]}, {cell[1]})")
+                inner = agent.snapshot()
+                for (stench, breeze), prob in self._percept_outcomes(agent, cell):
+                    survive += prob * self._outcome_value(agent, cell, stench, breeze, depth, history)
+                    agent.restore(inner)
+            finally:
+                agent.restore(snap)
+        value = die_prob * DEATH_PENALTY + (1 - die_prob) * min(survive, GOLD_REWARD)
+        self._memo[key] = value
+        return value
+
+    def _prior_value(self, agent, cell):
+        """Survival value of cell from the priors alone: its unknown neighbours turn safe if it shows no percept."""
+        n = agent.env.get_size()
+        x, y = cell
+        unknown = sum(
+            1 for nb in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+            if 0 <= nb[0] < n and 0 <= nb[1] < n and nb not in agent.pm.space
+        )
+        wumpus_prior = self.wumpus_count / (n * n)
+        clear = ((1 - wumpus_prior) * (1 - self.pit_prior)) ** unknown
+        return clear * unknown * self._cell_value
+
+    def _percept_outcomes(self, agent, cell):
+        """Distribution of (stench, breeze) on entering cell, neighbours treated as independent."""
+        n = agent.env.get_size()
+        x, y = cell
+        neighbours = [
+            nb for nb in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
+            if 0 <= nb[0] < n and 0 <= nb[1] < n and nb not in agent.pm.space
+        ]
+        # Every visited cell puts its neighbours in the KB, anything else only has the prior
+        constrained = [
+            nb for nb in neighbours
+            if any(adj in agent.visited for adj in [(nb[0] + 1, nb[1]), (nb[0] - 1, nb[1]), (nb[0], nb[1] + 1), (nb[0], nb[1] - 1)])
+        ]
+        queries = []
+        for cx, cy in constrained:
+            queries += [f"Wumpus({cx}, {cy})", f"Pit({cx}, {cy})"]
+        probs = agent.ie.model_check_probabilities(queries, deadline=self._deadline) if queries else []
+        marginals = {nb: (probs[2 * i], probs[2 * i + 1]) for i, nb in enumerate(constrained)}
+
+        wumpus_prior = self.wumpus_count / (n * n)
+        no_stench = no_breeze = 1.0
+        for nb in neighbours:
+            wumpus, pit = marginals.get(nb, (wumpus_prior, self.pit_prior))
+            no_stench *= 1 - wumpus
+            no_breeze *= 1 - pit
+        outcomes = []
+        for stench, p_s in ((False, no_stench), (True, 1 - no_stench)):
+            for breeze, p_b in ((False, no_breeze), (True, 1 - no_breeze)):
+                if p_s * p_b > 0:
+                    outcomes.append(((stench, breeze), p_s * p_b))
+        return outcomes
+
+    def _outcome_value(self, agent, cell, stench, breeze, depth, history):
+        """Play entering cell with the given percepts on the agent, caller restores."""
+        history = tuple(sorted(history + ((cell, stench, breeze),)))
+        agent.x, agent.y = cell
+        agent.visited.add(cell)
+        agent.cell_prob[cell] = 0
+        if cell in agent.uncertain_cell:
+            del agent.uncertain_cell[cell]
+        agent.pm.add_safe_cell(cell)
+        agent.pm.mark_visited(cell)
+        if not stench and not breeze:
+            agent.add_adj_as_safe_cell()
+        known_wumpus = len(agent.wumpus_at)
+        agent.update_kb_and_cell_prob({"stench": stench, "breeze": breeze, "glitter": False})
+        if agent.pending_probs:
+            agent.resolve_cell_probs()
+
+        gain = len(agent.pm.frontier) - self._root_frontier
+        value = max(gain, 0) * self._cell_value
+        if agent.can_shoot and len(agent.wumpus_at) > known_wumpus:
+            # shooting the new wumpus frees its cell
+            value += self._cell_value + ARROW_COST
+        if gain <= 0 and depth > 1:
+            value += self._decision_value(agent, depth - 1, history)
+        return value
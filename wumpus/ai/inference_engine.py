@@ -2,11 +2,14 @@ from typing import List, Dict, Optional
 from .rules_parser import LogicParser, Predicate, Not, And, Or, Implies, LogicExpr
 from .knowledge_base import Fact, KnowledgeBase
 import re
+import time
 
 class InferenceEngine:
     def __init__(self, kb: KnowledgeBase, debug: bool = False):
         self.kb = kb
         self.debug = debug
+        # False when the last model_check_probabilities call hit its deadline
+        self.last_complete = True
     
 
     def get_unknown_symbols(self, rules=None) -> List[Fact]:
@@ -65,38 +68,54 @@ class InferenceEngine:
         return True
 
     def model_check_probability(self, query: LogicExpr | str) -> float:  
-        if self.debug: 
-            print(f"Known facts: {self.kb.facts} ") 
-            print(f"Known rules: {self.kb.rules} ")
-            print(f"Query: {query} ")
-        if isinstance(query, str): 
-            query = LogicParser().parse(query) 
+        return self.model_check_probabilities([query])[0]
 
-        # step 1 direct fact checking 
-        if isinstance(query, Predicate) and query in self.kb.facts:
-            return 1.0
-
-        # if query is a negated predicate and its negation is a fact, return 0.0
-        if isinstance(query, Not) and isinstance(query.expr, Predicate) and query in self.kb.facts: 
-            return 0.0
-
-        # step 2: ground rules using known facts
+    def ground_rules(self) -> List[LogicExpr]:
+        """Ground every rule against the known facts, duplicates removed."""
         grounded_rules = []
+        seen = set()
         for rule in self.kb.rules:
-            if isinstance(rule, Implies):
+            if isinstance(rule, (Implies, Predicate)):
                 for fact in self.kb.facts:
                     unify_result = self.unify(fact, rule)
                     if unify_result:
                         subs, grounded_rule = unify_result
-                        grounded_rules.append(grounded_rule)
-            elif isinstance(rule, Predicate):
-                for fact in self.kb.facts:
-                    unify_result = self.unify(fact, rule)
-                    if unify_result:
-                        subs, grounded_rule = unify_result
-                        grounded_rules.append(grounded_rule)
+                        key = repr(grounded_rule)
+                        if key not in seen:
+                            seen.add(key)
+                            grounded_rules.append(grounded_rule)
             # Extend for And/Or/Not if needed
+        return grounded_rules
+
+    def model_check_probabilities(self, queries: List[LogicExpr | str], deadline: Optional[float] = None) -> List[float]:
+        """
+        Probability of each query, sharing one enumeration of the models of the KB.
+        Same semantics as calling model_check_probability once per query.
+        If deadline (a time.perf_counter() value) passes, the enumeration stops early and the
+        estimates from the models seen so far are returned, with last_complete set to False.
+        """
+        self.last_complete = True
+        parser = LogicParser()
+        queries = [parser.parse(q) if isinstance(q, str) else q for q in queries]
+        if self.debug: 
+            print(f"Known facts: {self.kb.facts} ") 
+            print(f"Known rules: {self.kb.rules} ")
+            print(f"Queries: {queries} ")
+
+        results: List[Optional[float]] = [None] * len(queries)
+        for i, query in enumerate(queries):
+            # step 1 direct fact checking 
+            if isinstance(query, Predicate) and query in self.kb.facts:
+                results[i] = 1.0
+            # if query is a negated predicate and its negation is a fact, return 0.0
+            elif isinstance(query, Not) and isinstance(query.expr, Predicate) and query in self.kb.facts: 
+                results[i] = 0.0
+        open_queries = [i for i, r in enumerate(results) if r is None]
+        if not open_queries:
+            return results
 
+        # step 2: ground rules using known facts
+        grounded_rules = self.ground_rules()
         if self.debug:
             print(f"Debug: Grounded rules from known facts: {grounded_rules}")
 
@@ -106,47 +125,43 @@ class InferenceEngine:
             # Check if symbol or its negation is in facts
             if symbol in self.kb.facts:
                 return True
-            from .rules_parser import Not
             neg = Not(symbol) if not isinstance(symbol, Not) else symbol.expr
             return neg in self.kb.facts
         unknown_symbols = [s for s in all_symbols if not is_known(s)]
 
         if self.debug:
-            print(f"Debug: Unknown symbols for query '{query}': {unknown_symbols}, all symbols: {all_symbols}")
+            print(f"Debug: Unknown symbols for queries {queries}: {unknown_symbols}, all symbols: {all_symbols}")
 
         kb_true_count = 0
-        query_true_count = 0
-
-        def model_check_recursive(unknown_symbols: List[str], query: LogicExpr, model: list[Fact]) -> float:
-            nonlocal kb_true_count
-            nonlocal query_true_count
-            if len(unknown_symbols) == 0:
+        query_true_counts = [0] * len(queries)
+        leaves = 0
+        # absence of a symbol from the model means it is false
+        model = set(self.kb.facts)
+
+        def model_check_recursive(i: int):
+            nonlocal kb_true_count, leaves
+            if not self.last_complete:
+                return
+            if i == len(unknown_symbols):
+                leaves += 1
+                if deadline is not None and leaves % 256 == 0 and time.perf_counter() > deadline:
+                    self.last_complete = False
                 if self.is_model_satisfied(grounded_rules, model):
                     kb_true_count += 1
-                    if self.is_model_satisfied([query], model):
-                        # if it goes here, it means the all kb rules is satisfied, including the query
-                        query_true_count += 1
-
-                # if self.debug:
-                #     print(f"No unknown symbols in first run, checking model: {model}")
-                #     print(f"Debug: Model {model} - KB satisfied: {kb_true_count}, Query satisfied: {query_true_count}")
-                return query_true_count / kb_true_count if kb_true_count > 0 else 0.5
-            next_symbol = unknown_symbols[0]
-            for truth_value in [True, False]:
-                new_model = model.copy()
-                if truth_value:
-                    new_model.append(next_symbol)
-                else:
-                    # absence of the symbol means it is false
-                    if next_symbol in new_model:
-                        new_model.remove(next_symbol)
-                model_check_recursive(unknown_symbols[1:], query, new_model)
-            return query_true_count / kb_true_count if kb_true_count > 0 else 0.5
-
-        prob = model_check_recursive(unknown_symbols, query, self.kb.facts)
-        # if self.debug:
-        #     print(f"Debug: Total models checked: {kb_true_count}, Query true count: {query_true_count}")
-        return prob
+                    for j in open_queries:
+                        if self.evaluate_expr(queries[j], model):
+                            query_true_counts[j] += 1
+                return
+            next_symbol = unknown_symbols[i]
+            model.add(next_symbol)
+            model_check_recursive(i + 1)
+            model.discard(next_symbol)
+            model_check_recursive(i + 1)
+
+        model_check_recursive(0)
+        for j in open_queries:
+            results[j] = query_true_counts[j] / kb_true_count if kb_true_count > 0 else 0.5
+        return results
 
     def _eval_math(self, expr: str, subs: Dict[str, str]) -> str:
         # basic maths, no parentheses
@@ -1,24 +1,86 @@
 from .rules_parser import LogicExpr, LogicParser, Predicate, Not, And, Or, Implies 
+from ..config import settings
 from typing import Union
+import hashlib
+import os
+import threading
 
 
 Fact = LogicExpr
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (rules path, facts path) -> (file stats, content hash, template KB)
+_templates: dict[tuple, tuple] = {}
+_templates_lock = threading.Lock()
+
 class KnowledgeBase:
     def __init__(self):
         self.facts: list[Fact] = []
         self.rules: list[LogicExpr] = []
         self.logic_parser = LogicParser()
+        # Bumped only when a fact/rule that was not known yet is added
+        self.version = 0
+        self._seen: set[str] = set()
+        self._seen_order: list[str] = []
+
+    def _bump_version(self, expr: LogicExpr):
+        key = repr(expr)
+        if key not in self._seen:
+            self._seen.add(key)
+            self._seen_order.append(key)
+            self.version += 1
 
+    def snapshot(self) -> tuple:
+        """
+        O(1) mark of the current contents. facts, rules and _seen only ever grow,
+        so restore() just truncates them back to the mark.
+        """
+        return (len(self.facts), len(self.rules), len(self._seen_order), self.version,
+                self.facts[-1] if self.facts else None, self.rules[-1] if self.rules else None)
+
+    def restore(self, snap: tuple):
+        n_facts, n_rules, n_seen, version, last_fact, last_rule = snap
+        if (n_facts > len(self.facts) or n_rules > len(self.rules)
+                or (n_facts and self.facts[n_facts - 1] is not last_fact)
+                or (n_rules and self.rules[n_rules - 1] is not last_rule)):
+            raise ValueError("snapshot does not belong to the history of this knowledge base")
+        del self.facts[n_facts:]
+        del self.rules[n_rules:]
+        for key in self._seen_order[n_seen:]:
+            self._seen.discard(key)
+        del self._seen_order[n_seen:]
+        self.version = version
+
+    def copy(self) -> "KnowledgeBase":
+        """Snapshot of the current facts and rules, safe to hand to another thread or process."""
+        kb = KnowledgeBase()
+        kb.facts = list(self.facts)
+        kb.rules = list(self.rules)
+        kb.version = self.version
+        kb._seen = set(self._seen)
+        kb._seen_order = list(self._seen_order)
+        return kb
+
+    def extend(self, other: "KnowledgeBase"):
+        """Append the facts and rules of other, sharing its parsed expressions."""
+        for fact in other.facts:
+            self.facts.append(fact)
+            self._bump_version(fact)
+        for rule in other.rules:
+            self.rules.append(rule)
+            self._bump_version(rule)
 
     def add_fact(self, fact_str: str):
         fact = self.logic_parser.parse(fact_str)
         self.facts.append(fact)
+        self._bump_version(fact)
 
     def add_rule(self, rule_str: str):
         try: 
             rule = self.logic_parser.parse(rule_str)
             self.rules.append(rule)
+            self._bump_version(rule)
         except Exception as e:
             print(f"Error adding rule: {e}, rule_str: {rule_str}")
 
@@ -62,5 +124,41 @@ class KnowledgeBase:
 
     def update_kb(self, some_fact: str): 
         self.add_fact(some_fact)
-        pass 
+        pass
+
+
+def resolve_kb_paths(rules_path: str = None, facts_path: str = None) -> tuple[str, str]:
+    """Explicit paths win over settings.RULES_PATH/FACTS_PATH; relative ones hang off the project root."""
+    paths = (rules_path or settings.RULES_PATH, facts_path or settings.FACTS_PATH)
+    return tuple(os.path.normpath(os.path.join(PROJECT_ROOT, path)) for path in paths)
+
+
+def load_kb_template(rules_path: str = None, facts_path: str = None) -> KnowledgeBase:
+    """
+    Parsed KB for the given rules/facts files, loaded once per process and shared.
+    Files are only re-read when their size or mtime change, and only re-parsed
+    when their content hash did. Never modify the result, clone it with copy().
+    """
+    rules_path, facts_path = resolve_kb_paths(rules_path, facts_path)
+    key = (rules_path, facts_path)
+    stats = tuple((st.st_size, st.st_mtime_ns) for st in map(os.stat, key))
+    with _templates_lock:
+        cached = _templates.get(key)
+        if cached is not None and cached[0] == stats:
+            return cached[2]
+        with open(rules_path, "rb") as f:
+            rules_data = f.read()
+        with open(facts_path, "rb") as f:
+            facts_data = f.read()
+        digest = hashlib.sha1(rules_data + b"\0" + facts_data).hexdigest()
+        if cached is not None and cached[1] == digest:
+            _templates[key] = (stats, digest, cached[2])
+            return cached[2]
 
+        template = KnowledgeBase()
+        for rule in rules_data.decode().splitlines():
+            template.add_rule(rule.strip())
+        for fact in facts_data.decode().splitlines():
+            template.add_fact(fact.strip())
+        _templates[key] = (stats, digest, template)
+        return template
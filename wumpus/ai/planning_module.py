@@ -1,10 +1,62 @@
 from heapdict import heapdict
-from ..config.settings import DIRECTIONS, DIRECTION_VECTORS
+import heapq
+import math
+from bisect import bisect_left, bisect_right
+import time
+from ..config.settings import DIRECTIONS, DIRECTION_VECTORS, DEATH_PENALTY, MOVE_COST
+
+DIRECTION_VECTORS_INV = {d: vec for vec, d in DIRECTION_VECTORS.items()}
+
+def _nearest_in_line(values, v):
+    """Entry of the sorted values closest to v on either side, v itself excluded; ties go to the lower side."""
+    lo, hi = bisect_left(values, v), bisect_right(values, v)
+    best = values[lo - 1] if lo else None
+    if hi < len(values) and (best is None or values[hi] - v < v - best):
+        best = values[hi]
+    return best
 
 class PlanningModule:
-    def __init__(self): 
-        self.space = {(0,0)} 
+    def __init__(self, exit_pos=(0,0), risk_weight=DEATH_PENALTY / MOVE_COST): 
+        self.space = set()
         self.solution = []       
+        # Price of -log(survival probability), in steps, when entering an uncertain cell
+        self.risk_weight = risk_weight
+        # Safe cells the agent has not stepped on yet
+        self.visited = set()
+        self.frontier = set()
+        # Bumped whenever space changes
+        self.version = 0
+        # False when the last multi-goal search was cut short by its deadline
+        self.last_search_complete = True
+        # Undo log of (fn, *args), only kept from a snapshot() until release() of that snapshot
+        self._trail: list[tuple] | None = None
+        self._trail_owner: tuple | None = None
+        # Reverse distance field rooted at the exit, keyed by (cell, heading on arrival)
+        self.exit_pos = exit_pos
+        self.exit_field: dict[tuple, int] = {}
+        # Row/column index of safe cells and confirmed wumpuses (sorted), used for hunting
+        self.safe_rows: dict[int, set[int]] = {}
+        self.safe_cols: dict[int, set[int]] = {}
+        self.wumpus_rows: dict[int, list[int]] = {}
+        self.wumpus_cols: dict[int, list[int]] = {}
+        self.firing_positions: dict[tuple, tuple] = {}  # safe cell -> nearest wumpus in its line of fire
+        self.reset()
+
+    def reset(self):
+        """Back to a fresh planner (only the exit cell is safe), reusing the containers."""
+        for container in (self.space, self.visited, self.frontier, self.exit_field,
+                          self.safe_rows, self.safe_cols, self.wumpus_rows, self.wumpus_cols, self.firing_positions):
+            container.clear()
+        self.solution = []
+        self.last_search_complete = True
+        self._trail = None
+        self._trail_owner = None
+        self.space.add(self.exit_pos)
+        self.frontier.update(self.space)
+        if self.exit_pos in self.space:
+            self._update_exit_field(self.exit_pos)
+        for cell in self.space:
+            self._index_safe_cell(cell)
 
     def heuristic(self, pos, goal):
         return abs(goal[0] - pos[0]) + abs(goal[1] - pos[1])
@@ -19,9 +71,298 @@ class PlanningModule:
 
         return 1 if desired_dir == cur_dir else 2
 
+    def _set_add(self, s, item):
+        if item not in s:
+            s.add(item)
+            if self._trail is not None:
+                self._trail.append((s.discard, item))
+
+    def _set_discard(self, s, item):
+        if item in s:
+            s.discard(item)
+            if self._trail is not None:
+                self._trail.append((s.add, item))
+
+    def _sorted_add(self, values, item):
+        k = bisect_left(values, item)
+        if k == len(values) or values[k] != item:
+            values.insert(k, item)
+            if self._trail is not None:
+                self._trail.append((values.remove, item))
+
+    def _sorted_discard(self, values, item):
+        k = bisect_left(values, item)
+        if k < len(values) and values[k] == item:
+            del values[k]
+            if self._trail is not None:
+                self._trail.append((values.insert, k, item))
+
+    def _dict_set(self, d, key, value):
+        if self._trail is not None:
+            if key in d:
+                self._trail.append((d.__setitem__, key, d[key]))
+            else:
+                self._trail.append((d.pop, key))
+        d[key] = value
+
+    def _dict_del(self, d, key):
+        if self._trail is not None:
+            self._trail.append((d.__setitem__, key, d[key]))
+        del d[key]
+
+    def snapshot(self) -> tuple:
+        """Mark in the undo log; cost of restore() is the number of changes made since."""
+        if self._trail is None:
+            self._trail = []
+            snap = (0, self.version, self.solution)
+            self._trail_owner = snap
+            return snap
+        return (len(self._trail), self.version, self.solution)
+
+    def release(self, snap: tuple):
+        """
+        Done restoring snap. When snap started the undo log, logging stops and the log is
+        dropped, so every snapshot taken since is invalid; snapshots nested in another are a no-op.
+        """
+        if snap is self._trail_owner:
+            self._trail = None
+            self._trail_owner = None
+
+    def restore(self, snap: tuple):
+        mark, version, solution = snap
+        if self._trail is None or mark > len(self._trail):
+            raise ValueError("snapshot does not belong to the history of this planning module")
+        while len(self._trail) > mark:
+            fn, *args = self._trail.pop()
+            fn(*args)
+        self.version = version
+        self.solution = solution
+
     def add_safe_cell(self, cell):
         if (cell not in self.space):
-            self.space.add(cell)
+            self._set_add(self.space, cell)
+            self.version += 1
+            if cell not in self.visited:
+                self._set_add(self.frontier, cell)
+            self._update_exit_field(cell)
+            self._index_safe_cell(cell)
+
+    def mark_visited(self, cell):
+        self._set_add(self.visited, cell)
+        self._set_discard(self.frontier, cell)
+
+    def get_nearest_frontier_route(self, start, start_dir, deadline=None):
+        result = self._search_nearest(start, self.frontier, start_dir, deadline=deadline)
+        if result is None:
+            return (-1, -1), None
+        goal, route, _ = result
+        return goal, route
+
+    def _update_exit_field(self, cell):
+        """Incrementally lower exit_field after cell joins the space (costs only ever decrease)."""
+        heap = []
+        if cell == self.exit_pos:
+            for d in DIRECTIONS:
+                self._dict_set(self.exit_field, (cell, d), 0)
+                heapq.heappush(heap, (0, cell, d))
+        else:
+            x, y = cell
+            for (dx, dy), d in DIRECTION_VECTORS.items():
+                nb_cost = self.exit_field.get(((x + dx, y + dy), d))
+                if nb_cost is None:
+                    continue
+                for h in DIRECTIONS:
+                    cand = nb_cost + (1 if h == d else 2)
+                    if cand < self.exit_field.get((cell, h), float('inf')):
+                        self._dict_set(self.exit_field, (cell, h), cand)
+                        heapq.heappush(heap, (cand, cell, h))
+
+        while heap:
+            cost, cur, d = heapq.heappop(heap)
+            if cost > self.exit_field.get((cur, d), float('inf')):
+                continue
+            # Only the cell behind cur (w.r.t. d) reaches (cur, d) with a single move
+            dx, dy = DIRECTION_VECTORS_INV[d]
+            prev = (cur[0] - dx, cur[1] - dy)
+            if prev not in self.space or prev == self.exit_pos:
+                continue
+            for h in DIRECTIONS:
+                cand = cost + (1 if h == d else 2)
+                if cand < self.exit_field.get((prev, h), float('inf')):
+                    self._dict_set(self.exit_field, (prev, h), cand)
+                    heapq.heappush(heap, (cand, prev, h))
+
+    def _index_safe_cell(self, cell):
+        x, y = cell
+        self._set_add(self.safe_rows.setdefault(y, set()), x)
+        self._set_add(self.safe_cols.setdefault(x, set()), y)
+        wumpus = self._find_wumpus_in_line(cell)
+        if wumpus is not None:
+            self._dict_set(self.firing_positions, cell, wumpus)
+
+    def _find_wumpus_in_line(self, cell):
+        """Nearest confirmed wumpus in cell's row or column, the one an arrow shot at it hits first."""
+        x, y = cell
+        wx = _nearest_in_line(self.wumpus_rows.get(y, ()), x)
+        wy = _nearest_in_line(self.wumpus_cols.get(x, ()), y)
+        if wx is not None and (wy is None or abs(wx - x) <= abs(wy - y)):
+            return (wx, y)
+        if wy is not None:
+            return (x, wy)
+        return None
+
+    def _aim_line(self, wumpus):
+        """Re-aim every safe cell in wumpus's row and column at its nearest wumpus."""
+        wx, wy = wumpus
+        lines = [(x, wy) for x in self.safe_rows.get(wy, ()) if x != wx] + [(wx, y) for y in self.safe_cols.get(wx, ()) if y != wy]
+        for cell in lines:
+            target = self._find_wumpus_in_line(cell)
+            if target is None:
+                if cell in self.firing_positions:
+                    self._dict_del(self.firing_positions, cell)
+            elif self.firing_positions.get(cell) != target:
+                self._dict_set(self.firing_positions, cell, target)
+
+    def add_wumpus(self, wumpus):
+        wx, wy = wumpus
+        if wx in self.wumpus_rows.get(wy, ()):
+            return
+        self._sorted_add(self.wumpus_rows.setdefault(wy, []), wx)
+        self._sorted_add(self.wumpus_cols.setdefault(wx, []), wy)
+        self._aim_line(wumpus)
+
+    def remove_wumpus(self, wumpus):
+        wx, wy = wumpus
+        if wx not in self.wumpus_rows.get(wy, ()):
+            return
+        self._sorted_discard(self.wumpus_rows[wy], wx)
+        self._sorted_discard(self.wumpus_cols[wx], wy)
+        self._aim_line(wumpus)
+
+    def get_shoot_dir(self, pos, wumpus):
+        """Heading the agent must face at pos so the arrow flies towards wumpus."""
+        (ax, ay), (wx, wy) = pos, wumpus
+        # Environment.shot_wumpus flies N towards decreasing y
+        if ax == wx:
+            return 'S' if wy > ay else 'N'
+        if ay == wy:
+            return 'E' if wx > ax else 'W'
+        return None
+
+    def get_nearest_shoot_route(self, start, start_dir, deadline=None):
+        """Nearest firing position for any known wumpus: (goal, route, wumpus, shoot_dir)."""
+        result = self._search_nearest(start, self.firing_positions, start_dir, deadline=deadline)
+        if result is None:
+            return (-1, -1), None, None, None
+        goal, route, _ = result
+        wumpus = self.firing_positions[goal]
+        return goal, route, wumpus, self.get_shoot_dir(goal, wumpus)
+
+    def risk_cost(self, die_prob):
+        if die_prob >= 1:
+            return float('inf')
+        return -self.risk_weight * math.log(1 - die_prob)
+
+    def get_risky_route(self, start, risky_cells, start_dir, max_risk=1.0, deadline=None):
+        """
+        Best uncertain cell to step into and the safe route leading to it, in one search.
+        risky_cells maps cell -> die probability; returns (goal, route, die_prob).
+        """
+        goals = {
+            cell: prob for cell, prob in risky_cells.items()
+            if prob < max_risk and cell not in self.space
+        }
+        result = self._search_nearest(start, goals, start_dir, entry_cost=lambda cell: self.risk_cost(goals[cell]),
+                                      deadline=deadline)
+        if result is None:
+            return (-1, -1), None, None
+        goal, route, _ = result
+        return goal, route, goals[goal]
+
+    def _search_nearest(self, start, goals, start_dir, entry_cost=None, deadline=None):
+        """
+        Single Dijkstra over (cell, heading) that stops at the first goal reached.
+        With entry_cost, goals outside the space may be entered (never crossed) at that extra cost.
+        Past the deadline, the cheapest goal reached so far (if any) is returned instead.
+        """
+        if not goals:
+            return None
+        came_from = {}
+        g_score = {(start, start_dir): 0}
+        open_set = [(0, start, start_dir)]
+        best_goal = None  # cheapest goal state pushed so far
+        expanded = 0
+
+        def build(state, cost):
+            path = []
+            goal = state[0]
+            while state in came_from:
+                path.append(state[0])
+                state = came_from[state]
+            path.reverse()
+            return goal, path, cost
+
+        self.last_search_complete = True
+        while open_set:
+            cost, current, cur_dir = heapq.heappop(open_set)
+            if cost > g_score[(current, cur_dir)]:
+                continue
+            if current in goals:
+                return build((current, cur_dir), cost)
+            expanded += 1
+            if deadline is not None and expanded % 64 == 0 and time.perf_counter() > deadline:
+                self.last_search_complete = False
+                return build(best_goal[1], best_goal[0]) if best_goal is not None else None
+            for (dx, dy), d in DIRECTION_VECTORS.items():
+                neighbor = (current[0] + dx, current[1] + dy)
+                tentative_g = cost + (1 if d == cur_dir else 2)
+                if neighbor not in self.space:
+                    if entry_cost is None or neighbor not in goals:
+                        continue
+                    tentative_g += entry_cost(neighbor)
+                if tentative_g < g_score.get((neighbor, d), float('inf')):
+                    g_score[(neighbor, d)] = tentative_g
+                    came_from[(neighbor, d)] = (current, cur_dir)
+                    heapq.heappush(open_set, (tentative_g, neighbor, d))
+                    if neighbor in goals and (best_goal is None or tentative_g < best_goal[0]):
+                        best_goal = (tentative_g, (neighbor, d))
+        return None
+
+    def route_to_exit(self, start, start_dir):
+        """Greedy descent on exit_field, same return shape as find_route."""
+        total = self.exit_field.get((start, start_dir))
+        if total is None:
+            return self._search_exit(start, start_dir)
+        path = []
+        cur, value = start, total
+        h = start_dir
+        while cur != self.exit_pos:
+            best, best_cost = None, float('inf')
+            for (dx, dy), d in DIRECTION_VECTORS.items():
+                nb = (cur[0] + dx, cur[1] + dy)
+                field = self.exit_field.get((nb, d))
+                # only safe cells strictly closer to the exit, so the descent cannot loop
+                if nb not in self.space or field is None or field >= value:
+                    continue
+                cand = (1 if h == d else 2) + field
+                if cand < best_cost:
+                    best, best_cost = (nb, d), cand
+            if best is None:
+                # the field is out of step with space, fall back to a fresh search
+                return self._search_exit(start, start_dir)
+            cur, h = best
+            value = self.exit_field[best]
+            path.append(cur)
+        self.solution = path
+        return path, total
+
+    def _search_exit(self, start, start_dir):
+        result = self._search_nearest(start, {self.exit_pos}, start_dir)
+        if result is None:
+            return None, None
+        _, path, cost = result
+        self.solution = path
+        return path, cost
 
     def _get_next_pos(self, cur_pos):
         # Adjacent moves in 4 directions
@@ -0,0 +1,32 @@
+from .core.environment import Environment
+from .core.vec_environment import VecEnvironment, FORWARD, TURN_LEFT, TURN_RIGHT
+from .agents.random_agent import RandomAgent
+import random
+import time
+
+def bench_vec_environment(batch=1024, steps=100, scalar_agents=64):
+    """World-steps per second of VecEnvironment.step against stepping RandomAgents one by one."""
+    vec = VecEnvironment(batch, N=8)
+    vec.reset(range(batch))
+    rng = random.Random(0)
+    moves = [FORWARD, TURN_LEFT, TURN_RIGHT]
+    actions = [[rng.choice(moves) for _ in range(batch)] for _ in range(steps)]
+    start = time.perf_counter()
+    for row in actions:
+        vec.step(row)
+    vec_rate = batch * steps / (time.perf_counter() - start)
+
+    agents = [RandomAgent(Environment(N=8, seed=seed)) for seed in range(scalar_agents)]
+    taken = 0
+    start = time.perf_counter()
+    for row in actions:
+        for agent, action in zip(agents, row):
+            if agent.alive:
+                {FORWARD: agent.move_forward, TURN_LEFT: agent.turn_left, TURN_RIGHT: agent.turn_right}[action]()
+                taken += 1
+    scalar_rate = taken / (time.perf_counter() - start)
+    print(f"VecEnvironment: {vec_rate:.0f} world-steps/s, scalar: {scalar_rate:.0f} world-steps/s ({vec_rate / scalar_rate:.1f}x)")
+    return vec_rate, scalar_rate
+
+if __name__ == "__main__":
+    bench_vec_environment()
@@ -8,8 +8,13 @@ DEFAULT_PIT_PROBABILITY = 0.2
 DEFAULT_WUMPUS_COUNT = 1
 MAX_STEPS = 1000
 
+# Knowledge base files, relative paths are resolved against the project root
+RULES_PATH = "rules.txt"
+FACTS_PATH = "facts.txt"
+
 # Scoring System
 GOLD_REWARD = 1000
+GRAB_REWARD = 10
 DEATH_PENALTY = -1000
 ARROW_COST = -10
 MOVE_COST = -1
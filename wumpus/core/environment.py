@@ -1,4 +1,8 @@
 import random
+from bisect import bisect_left, bisect_right
+import struct
+from types import MappingProxyType
+from .seeding import WorldKey
 
 class Cell:
     def __init__(self):
@@ -9,11 +13,57 @@ class Cell:
         self.safe = None  # True / False / None (unknown)
         self.percepts = {'stench': False, 'breeze': False, 'glitter': False}  # Store percepts when visited
 
+# Bits of the stored-percepts plane
+STENCH, BREEZE, GLITTER = 1, 2, 4
+# Values of the safe plane
+UNKNOWN, SAFE, DANGEROUS = 0, 1, 2
+# Shared read-only percept records, indexed by percept bits
+PERCEPTS = tuple(
+    MappingProxyType({'stench': bool(bits & STENCH), 'breeze': bool(bits & BREEZE), 'glitter': bool(bits & GLITTER)})
+    for bits in range(8)
+)
+
+# Compact world records: header, then the pit and wumpus planes bit-packed (bit k of byte j is cell 8 * j + k)
+RECORD_VERSION = 1
+RECORD_HEADER = struct.Struct("<BxHiQ")  # version, N, gold cell or -1, seed or NO_SEED when unknown
+NO_SEED = (1 << 64) - 1  # the bytes of an int64 -1, which older records stored instead
+_UNPACK = tuple(bytes((b >> k) & 1 for k in range(8)) for b in range(256))
+
+def record_size(N):
+    return RECORD_HEADER.size + 2 * ((N * N + 7) // 8)
+
+# Byte value -> 1 if any of its bits is set
+_NONZERO = bytes([0]) + bytes([1]) * 255
+
+def _pack_bits(plane):
+    packed = bytearray((len(plane) + 7) // 8)
+    i = plane.find(1)
+    while i != -1:
+        packed[i >> 3] |= 1 << (i & 7)
+        i = plane.find(1, i + 1)
+    return packed
+
 class Environment:
+    """
+    Cells live in flat bytearray planes indexed by y * N + x, one byte per cell and plane,
+    instead of one Cell object (and percepts dict) per square.
+    """
     def __init__(self, N=8, K=2, pit_prob=0.2, seed=None):
-        self._rand = random.Random(seed + pit_prob * 10 - N / 2) if seed is not None else random.Random()
+        if isinstance(seed, WorldKey):
+            self._rand = seed.random(N, K, pit_prob)
+        elif seed is not None:
+            # Legacy integer seeds, kept so existing seeds still name the same maps. Different
+            # (seed, pit_prob, N) can land on the same generator, use a WorldKey for sweeps
+            self._rand = random.Random(seed + pit_prob * 10 - N / 2)
+        else:
+            self._rand = random.Random()
         self.__N = N
-        self.__grid = [[Cell() for _ in range(N)] for _ in range(N)]
+        self.__pits = bytearray(N * N)
+        self.__wumpuses = bytearray(N * N)
+        self.__gold = bytearray(N * N)
+        self.__visited = bytearray(N * N)
+        self.__safe = bytearray(N * N)
+        self.__seen = bytearray(N * N)  # percept bits stored when a cell is visited
         self.__agent_pos = (0, 0)
         self.__agent_dir = 'E'  # E, N, W, S
         self.__scream = False
@@ -22,14 +72,186 @@ class Environment:
         self.__place_pits(pit_prob)
         self.__place_wumpus(K)
         self.__place_gold()
+        self.__build_percept_planes()
+        self.__initial = self.snapshot()
+
+    @classmethod
+    def from_planes(cls, N, pits, wumpuses, gold):
+        """World from (pits, wumpuses, gold) planes as get_hazard_planes returns them, agent at the start."""
+        if not len(pits) == len(wumpuses) == len(gold) == N * N:
+            raise ValueError(f"planes must hold {N * N} cells")
+        env = cls.__new__(cls)
+        env._rand = random.Random()
+        env.__N = N
+        env.__pits = bytearray(pits)
+        env.__wumpuses = bytearray(wumpuses)
+        env.__gold = bytearray(gold)
+        env.__visited = bytearray(N * N)
+        env.__safe = bytearray(N * N)
+        env.__seen = bytearray(N * N)
+        env.__agent_pos = (0, 0)
+        env.__agent_dir = 'E'
+        env.__scream = False
+        env.__wumpus = env.__wumpuses.count(1)
+        i = env.__gold.find(1)
+        if i != -1:
+            env.__gold_pos = (i % N, i // N)
+        env.__build_percept_planes()
+        env.__initial = env.snapshot()
+        return env
+
+    @classmethod
+    def from_record(cls, record):
+        """World from a to_record() record, any bytes-like object such as a slice of a mapped corpus."""
+        version, N, gold, _ = RECORD_HEADER.unpack_from(record)
+        if version != RECORD_VERSION:
+            raise ValueError(f"unsupported world record version {version}")
+        record = memoryview(record)
+        if len(record) < record_size(N):
+            raise ValueError(f"truncated world record for N={N}")
+        n, size = N * N, (N * N + 7) // 8
+        start = RECORD_HEADER.size
+        pits = b"".join([_UNPACK[b] for b in record[start:start + size]])[:n]
+        wumpuses = b"".join([_UNPACK[b] for b in record[start + size:start + 2 * size]])[:n]
+        gold_plane = bytearray(n)
+        if gold >= 0:
+            gold_plane[gold] = 1
+        return cls.from_planes(N, pits, wumpuses, gold_plane)
+
+    def to_record(self, seed=NO_SEED):
+        """
+        Hazards and the original gold cell as a compact record, agent state is not kept.
+        seed is stored as an unsigned 64-bit value, negative ints wrap to their two's complement.
+        """
+        gold = -1
+        if hasattr(self, '_Environment__gold_pos'):
+            gold = self.__gold_pos[1] * self.__N + self.__gold_pos[0]
+        header = RECORD_HEADER.pack(RECORD_VERSION, self.__N, gold, seed & NO_SEED)
+        return header + _pack_bits(self.__pits) + _pack_bits(self.__wumpuses)
+
+    def __setstate__(self, state):
+        # Pickles from before the planes still carry a grid of Cell objects
+        grid = state.pop('_Environment__grid', None)
+        self.__dict__.update(state)
+        if grid is not None:
+            cells = [cell for row in grid for cell in row]
+            self.__pits = bytearray(cell.has_pit for cell in cells)
+            self.__wumpuses = bytearray(cell.has_wumpus for cell in cells)
+            self.__gold = bytearray(cell.has_gold for cell in cells)
+            self.__visited = bytearray(cell.visited for cell in cells)
+            self.__safe = bytearray(UNKNOWN if cell.safe is None else SAFE if cell.safe else DANGEROUS for cell in cells)
+            self.__seen = bytearray(
+                (STENCH if cell.percepts['stench'] else 0) | (BREEZE if cell.percepts['breeze'] else 0)
+                | (GLITTER if cell.percepts['glitter'] else 0)
+                for cell in cells
+            )
+        if '_Environment__senses' not in self.__dict__:
+            self.__build_percept_planes()
+        if '_Environment__wumpus_rows' not in self.__dict__:
+            self.__build_wumpus_index()
+        if '_Environment__initial' not in self.__dict__:
+            self.__initial = self.snapshot()
+
+    # Planes that change during an episode come in two groups. Snapshots and clones share them
+    # and the first write after that copies the whole group, so both are O(1) until then.
+    def snapshot(self):
+        """Current pose, hazards, gold, marks and scream, to hand back to reset()."""
+        self.__shared_hazards = self.__shared_marks = True
+        return (
+            (self.__wumpuses, self.__stench_count, self.__senses, self.__gold, self.__wumpus_rows, self.__wumpus_cols),
+            (self.__visited, self.__safe, self.__seen),
+            self.__wumpus, self.__agent_pos, self.__agent_dir, self.__scream,
+        )
+
+    def reset(self, snapshot=None):
+        """Back to a snapshot(), by default the state the world was created (or loaded) in."""
+        hazards, marks, self.__wumpus, self.__agent_pos, self.__agent_dir, self.__scream = snapshot or self.__initial
+        self.__wumpuses, self.__stench_count, self.__senses, self.__gold, self.__wumpus_rows, self.__wumpus_cols = hazards
+        self.__visited, self.__safe, self.__seen = marks
+        self.__shared_hazards = self.__shared_marks = True
+
+    def clone(self):
+        """Independent copy of this world, sharing every plane until one side writes to it."""
+        twin = type(self).__new__(type(self))
+        twin.__dict__.update(self.__dict__)
+        self.__shared_hazards = self.__shared_marks = True
+        twin.__shared_hazards = twin.__shared_marks = True
+        return twin
+
+    def __own_hazards(self):
+        self.__wumpuses = bytearray(self.__wumpuses)
+        self.__stench_count = bytearray(self.__stench_count)
+        self.__senses = bytearray(self.__senses)
+        self.__gold = bytearray(self.__gold)
+        self.__wumpus_rows = dict(self.__wumpus_rows)
+        self.__wumpus_cols = dict(self.__wumpus_cols)
+        self.__shared_hazards = False
+
+    def __own_marks(self):
+        self.__visited = bytearray(self.__visited)
+        self.__safe = bytearray(self.__safe)
+        self.__seen = bytearray(self.__seen)
+        self.__shared_marks = False
+
+    def __build_percept_planes(self):
+        """
+        Percept bits of every cell, from the hazard planes read as big integers: shifting one
+        byte (or one row) moves every hazard onto a neighbour, and with at most four neighbours
+        the per-byte sums never carry into the next cell.
+        """
+        N = self.__N
+        size = N * N
+        full = (1 << 8 * size) - 1
+        # bytes that may take a hazard from the west (x > 0) and from the east (x < N - 1)
+        from_west = int.from_bytes((b'\x00' + b'\xff' * (N - 1)) * N, 'little')
+        from_east = int.from_bytes((b'\xff' * (N - 1) + b'\x00') * N, 'little')
+
+        def around(plane):
+            v = int.from_bytes(plane, 'little')
+            total = ((v << 8) & from_west) + ((v >> 8) & from_east) + ((v << 8 * N) & full) + (v >> 8 * N)
+            return total.to_bytes(size, 'little')
+
+        stench_count = around(self.__wumpuses)
+        breeze = int.from_bytes(around(self.__pits).translate(_NONZERO), 'little')
+        stench = int.from_bytes(stench_count.translate(_NONZERO), 'little')
+        self.__stench_count = bytearray(stench_count)  # adjacent live wumpuses, so kills can update it
+        self.__senses = bytearray((stench * STENCH | breeze * BREEZE).to_bytes(size, 'little'))
+        i = self.__gold.find(1)
+        if i != -1:
+            self.__senses[i] |= GLITTER
+        self.__build_wumpus_index()
+
+    def __build_wumpus_index(self):
+        """Sorted x of the live wumpuses per row and sorted y per column, so arrows resolve by bisect."""
+        rows, cols = {}, {}
+        i = self.__wumpuses.find(1)
+        while i != -1:  # ascending i, so both lists come out sorted
+            y, x = divmod(i, self.__N)
+            rows.setdefault(y, []).append(x)
+            cols.setdefault(x, []).append(y)
+            i = self.__wumpuses.find(1, i + 1)
+        # tuples, a kill replaces the entry, so copying the dicts is enough to unshare them
+        self.__wumpus_rows = {y: tuple(xs) for y, xs in rows.items()}
+        self.__wumpus_cols = {x: tuple(ys) for x, ys in cols.items()}
+
+    def __neighbours(self, i):
+        N = self.__N
+        x = i % N
+        if x > 0:
+            yield i - 1
+        if x < N - 1:
+            yield i + 1
+        if i >= N:
+            yield i - N
+        if i < N * N - N:
+            yield i + N
 
     # Randomly place pits based on probability
     def __place_pits(self, pit_prob):
-        for y in range(self.__N):
-            for x in range(self.__N):
-                if (x, y) == (0, 0): continue
-                if self._rand.random() < pit_prob:
-                    self.__grid[y][x].has_pit = True
+        # one draw per cell in order, as legacy seeds expect; never at (0, 0)
+        rand = self._rand.random
+        draws = [rand() for _ in range(self.__N * self.__N - 1)]
+        self.__pits[1:] = bytes(map(float(pit_prob).__gt__, draws))
 
     # Randomly place Wumpus
     # Ensure at least K Wumpuses are placed, not in (0, 0)
@@ -38,8 +260,9 @@ class Environment:
         while placed < K:
             x = self._rand.randint(0, self.__N - 1)
             y = self._rand.randint(0, self.__N - 1)
-            if (x, y) != (0, 0) and not self.__grid[y][x].has_pit and not self.__grid[y][x].has_wumpus:
-                self.__grid[y][x].has_wumpus = True
+            i = y * self.__N + x
+            if (x, y) != (0, 0) and not self.__pits[i] and not self.__wumpuses[i]:
+                self.__wumpuses[i] = 1
                 placed += 1
 
     # Randomly place gold
@@ -47,8 +270,9 @@ class Environment:
         while True:
             x = self._rand.randint(0, self.__N - 1)
             y = self._rand.randint(0, self.__N - 1)
-            if not self.__grid[y][x].has_pit and not self.__grid[y][x].has_wumpus:
-                self.__grid[y][x].has_gold = True
+            i = y * self.__N + x
+            if not self.__pits[i] and not self.__wumpuses[i]:
+                self.__gold[i] = 1
                 self.__gold_pos = (x, y)
                 break
 
@@ -64,33 +288,60 @@ class Environment:
         
     def get_size(self):
         return self.__N
+
+    def get_hazard_planes(self):
+        """Copies of the (pits, wumpuses, gold) planes, one byte per cell at y * N + x."""
+        return bytes(self.__pits), bytes(self.__wumpuses), bytes(self.__gold)
     
 
+    def arrow_target(self, x=None, y=None, direction=None):
+        """First live wumpus an arrow shot from (x, y) towards direction would hit, or None.
+        Defaults to the agent's pose; N flies towards decreasing y, as shot_wumpus always has."""
+        if x is None:
+            (x, y), direction = self.__agent_pos, self.__agent_dir
+        if direction in ('E', 'W'):
+            xs = self.__wumpus_rows.get(y, ())
+            if direction == 'E':
+                k = bisect_right(xs, x)
+                return (xs[k], y) if k < len(xs) else None
+            k = bisect_left(xs, x)
+            return (xs[k - 1], y) if k else None
+        if direction in ('N', 'S'):
+            ys = self.__wumpus_cols.get(x, ())
+            if direction == 'S':
+                k = bisect_right(ys, y)
+                return (x, ys[k]) if k < len(ys) else None
+            k = bisect_left(ys, y)
+            return (x, ys[k - 1]) if k else None
+        return None
+
     def shot_wumpus(self):
-        dx, dy = 0, 0
-        if self.__agent_dir == 'N':
-            dy = -1
-        elif self.__agent_dir == 'S':
-            dy = 1
-        elif self.__agent_dir == 'E':
-            dx = 1
-        elif self.__agent_dir == 'W':
-            dx = -1
-
-        for step in range(1, self.__N):
-            x, y = self.__agent_pos
-            nx, ny = x + dx * step, y + dy * step
-            if 0 <= nx < self.__N and 0 <= ny < self.__N:
-                if self.has_wumpus(nx, ny):
-                    self.__scream = True
-                    self.__wumpus -= 1
-                    # Remove the Wumpus from the grid
-                    self.__grid[ny][nx].has_wumpus = False
-                    return True
-        return False
+        target = self.arrow_target()
+        if target is None:
+            return False
+        if self.__shared_hazards:
+            self.__own_hazards()
+        self.__scream = True
+        self.__wumpus -= 1
+        # Remove the Wumpus from the grid and the index
+        nx, ny = target
+        i = ny * self.__N + nx
+        self.__wumpuses[i] = 0
+        row = tuple(x for x in self.__wumpus_rows[ny] if x != nx)
+        col = tuple(y for y in self.__wumpus_cols[nx] if y != ny)
+        self.__wumpus_rows[ny] = row
+        self.__wumpus_cols[nx] = col
+        for j in self.__neighbours(i):
+            self.__stench_count[j] -= 1
+            if not self.__stench_count[j]:
+                self.__senses[j] &= ~STENCH
+        return True
     def grabbed_gold(self):
+        if self.__shared_hazards:
+            self.__own_hazards()
         x, y = self.__gold_pos
-        self.__grid[y][x].has_gold = False
+        self.__gold[y * self.__N + x] = 0
+        self.__senses[y * self.__N + x] &= ~GLITTER
 
     def set_agent_pos_and_dir(self, x, y, direction):
         if 0 <= x < self.__N and 0 <= y < self.__N:
@@ -100,65 +351,71 @@ class Environment:
             raise ValueError("Agent position out of bounds")
         
     def set_safe(self, x, y):
-        self.__grid[y][x].safe = True
+        if self.__shared_marks:
+            self.__own_marks()
+        self.__safe[y * self.__N + x] = SAFE
     def set_dangerous(self, x, y):
-        self.__grid[y][x].safe = False
+        if self.__shared_marks:
+            self.__own_marks()
+        self.__safe[y * self.__N + x] = DANGEROUS
 
     def has_pit(self, x, y):
         if 0 <= x < self.__N and 0 <= y < self.__N:
-            return self.__grid[y][x].has_pit
+            return self.__pits[y * self.__N + x] == 1
         return False
     def has_wumpus(self, x, y):
         if 0 <= x < self.__N and 0 <= y < self.__N:
-            return self.__grid[y][x].has_wumpus
+            return self.__wumpuses[y * self.__N + x] == 1
         return False
     
     def has_gold(self, x, y):
         if 0 <= x < self.__N and 0 <= y < self.__N:
-            return self.__grid[y][x].has_gold
+            return self.__gold[y * self.__N + x] == 1
         return False
     
     def is_visited(self, x, y):
         if 0 <= x < self.__N and 0 <= y < self.__N:
-            return self.__grid[y][x].visited
+            return self.__visited[y * self.__N + x] == 1
         return False
     
     def mark_visited(self, x, y):
         if 0 <= x < self.__N and 0 <= y < self.__N:
-            self.__grid[y][x].visited = True
+            if self.__shared_marks:
+                self.__own_marks()
+            i = y * self.__N + x
+            self.__visited[i] = 1
             # Store percepts for this cell when visited
-            percepts = self.get_percepts(x, y)
-            self.__grid[y][x].percepts = percepts
+            self.__seen[i] = self.__senses[i]
     
     def reset_visited_cells(self):
         """Reset all visited markers in the environment and restore gold to original position"""
-        for y in range(self.__N):
-            for x in range(self.__N):
-                self.__grid[y][x].visited = False
-                self.__grid[y][x].percepts = {'stench': False, 'breeze': False, 'glitter': False}
+        self.__visited = bytearray(self.__N * self.__N)
+        self.__seen = bytearray(self.__N * self.__N)
         
         # Restore gold to its original position if it was grabbed
         if hasattr(self, '_Environment__gold_pos'):
+            if self.__shared_hazards:
+                self.__own_hazards()
             gold_x, gold_y = self.__gold_pos
-            self.__grid[gold_y][gold_x].has_gold = True
+            self.__gold[gold_y * self.__N + gold_x] = 1
+            self.__senses[gold_y * self.__N + gold_x] |= GLITTER
     
     def get_cell_percepts(self, x, y):
         """Get the stored percepts for a visited cell"""
-        if 0 <= x < self.__N and 0 <= y < self.__N and self.__grid[y][x].visited:
-            return self.__grid[y][x].percepts
-        return {'stench': False, 'breeze': False, 'glitter': False}
+        if 0 <= x < self.__N and 0 <= y < self.__N and self.__visited[y * self.__N + x]:
+            return PERCEPTS[self.__seen[y * self.__N + x]]
+        return PERCEPTS[0]
     
     def get_percepts(self, x, y):
-        stench = breeze = glitter = False
-        for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-            nx, ny = x+dx, y+dy
-            if 0 <= nx < self.__N and 0 <= ny < self.__N:
-                if self.__grid[ny][nx].has_wumpus:
-                    stench = True
-                if self.__grid[ny][nx].has_pit:
-                    breeze = True
-        glitter = self.__grid[y][x].has_gold
-        return {'stench': stench, 'breeze': breeze, 'glitter': glitter}
+        """Read-only {'stench', 'breeze', 'glitter'} record, shared between calls."""
+        return PERCEPTS[self.get_percept_bits(x, y)]
+
+    def get_percept_bits(self, x, y):
+        """Same as get_percepts packed as STENCH | BREEZE | GLITTER bits."""
+        if not (0 <= x < self.__N and 0 <= y < self.__N):
+            # the flat index would wrap onto another row
+            raise IndexError(f"cell ({x}, {y}) is outside the {self.__N}x{self.__N} grid")
+        return self.__senses[y * self.__N + x]
     
     def print_environment_state(self):
         print(f"Grid size: {self.__N}x{self.__N}")
@@ -169,13 +426,12 @@ class Environment:
         for y in range(self.__N):
             row = []
             for x in range(self.__N):
-                cell = self.__grid[y][x]
                 cell_str = ""
-                if cell.has_wumpus:
+                if self.has_wumpus(x, y):
                     cell_str += "W"
-                if cell.has_pit:
+                if self.has_pit(x, y):
                     cell_str += "P"
-                if cell.has_gold:
+                if self.has_gold(x, y):
                     cell_str += "G"
                 # Pad or trim to 3 characters
                 cell_str = cell_str[:3].ljust(3)
@@ -183,5 +439,3 @@ class Environment:
                     cell_str = ".  "
                 row.append(cell_str)
             print(" ".join(row))
-
-
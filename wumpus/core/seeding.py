@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from functools import lru_cache
+import random
+import struct
+import numpy as np
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(z):
+    """splitmix64 finaliser over a uint64 array, a bijection so distinct inputs never collide."""
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+@lru_cache(maxsize=1024)
+def _stream_base(root, spawn_key):
+    return np.uint64(np.random.SeedSequence(root, spawn_key=spawn_key).generate_state(1, np.uint64)[0])
+
+
+def _world_seeds(base, start, count):
+    with np.errstate(over='ignore'):
+        return _mix(base + np.arange(start, start + count, dtype=np.uint64) * _GOLDEN)
+
+
+@dataclass(frozen=True)
+class WorldKey:
+    """
+    Stable name of one world: the experiment's root entropy, the spawn path of the stream
+    it came from and its index in that stream. Pass it as Environment's seed; the world's
+    size, wumpus count and pit probability are mixed in as well, so changing any of them
+    gives an unrelated world instead of a shifted copy.
+    """
+    root: int
+    spawn_key: tuple[int, ...]
+    index: int
+
+    @property
+    def seed(self) -> int:
+        """64-bit world seed, the same number SeedStream.world_seeds gives for this index."""
+        return int(_world_seeds(_stream_base(self.root, self.spawn_key), self.index, 1)[0])
+
+    def random(self, N, K, pit_prob) -> random.Random:
+        return random.Random(struct.pack("<QIId", self.seed, N, K, pit_prob))
+
+    def __str__(self):
+        return "/".join(map(str, (self.root,) + self.spawn_key)) + f":{self.index}"
+
+
+class SeedStream:
+    """
+    Numbered worlds for one run, split into independent child streams the way numpy's
+    SeedSequence spawns them: each worker gets stream.spawn(n)[i], can spawn again for its
+    own shards, and never sees a world another stream produces. Everything derives from
+    root, so logging str(key) or the root alone is enough to rerun any part of a sweep.
+    """
+
+    def __init__(self, root=None, spawn_key=()):
+        self.root = np.random.SeedSequence(root).entropy  # fresh entropy when root is None
+        self.spawn_key = tuple(spawn_key)
+        self._base = _stream_base(self.root, self.spawn_key)
+        self._spawned = 0
+
+    def spawn(self, n) -> list["SeedStream"]:
+        """n new child streams; later calls continue the numbering like SeedSequence.spawn."""
+        children = [SeedStream(self.root, self.spawn_key + (self._spawned + i,)) for i in range(n)]
+        self._spawned += n
+        return children
+
+    def key(self, index) -> WorldKey:
+        return WorldKey(self.root, self.spawn_key, index)
+
+    def keys(self, start=0, count=None):
+        index = start
+        while count is None or index < start + count:
+            yield self.key(index)
+            index += 1
+
+    def world_seeds(self, start, count) -> np.ndarray:
+        """uint64 seeds of worlds start..start + count, distinct within the stream."""
+        return _world_seeds(self._base, start, count)
@@ -0,0 +1,225 @@
+from collections import OrderedDict
+import numpy as np
+from .environment import STENCH, BREEZE, GLITTER, SAFE, DANGEROUS, PERCEPTS
+from .world_generator import _hash_uniforms, _PIT, _WUMPUS, _GOLD
+from .seeding import WorldKey
+from ..config.settings import DEFAULT_PIT_PROBABILITY
+
+# Bits of a cached chunk cell
+PIT, WUMPUS = 1, 2
+_ARROW_SEGMENT = 1024
+
+
+class SparseEnvironment:
+    """
+    Huge procedural world with the accessor methods of Environment, for N up to ~10^9 per side.
+
+    Hazards are never stored for the whole grid: cell (x, y) has a pit with pit_prob and
+    otherwise a wumpus with wumpus_prob, both drawn from a counter-based hash of
+    (seed, y * N + x), so any cell can be derived on its own. Derived cells are cached in
+    chunk_size x chunk_size chunks, at most max_chunks of them, least recently used first out.
+    Only what the agent changed (visits, kills, safety marks) is kept per cell, so memory
+    follows the explored area. The gold lies on a hazard-free cell within gold_radius of (0, 0).
+    """
+
+    def __init__(self, N=100_000, pit_prob=DEFAULT_PIT_PROBABILITY, wumpus_prob=0.02, seed=0,
+                 gold_radius=16, chunk_size=32, max_chunks=1024):
+        self.__N = N
+        self.pit_prob = pit_prob
+        self.wumpus_prob = wumpus_prob
+        if isinstance(seed, WorldKey):
+            seed = seed.seed
+        self._seed = np.array([seed], dtype=np.uint64)
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self._chunks: OrderedDict[tuple, bytes] = OrderedDict()
+        self.chunk_misses = 0
+
+        # Lowest gold key among the free cells of the gold_radius square, like world_generator picks it
+        r = min(N, gold_radius)
+        cells = (np.arange(r)[:, None] * N + np.arange(r)[None, :]).ravel()
+        keys = _hash_uniforms(self._seed, cells, _GOLD)[0]
+        keys[self._hazards_at(cells) != 0] = np.inf
+        best = int(cells[keys.argmin()])
+        self.__gold_pos = (best % N, best // N)
+
+        self.__agent_pos = (0, 0)
+        self.__agent_dir = 'E'
+        self.__scream = False
+        self.__gold_taken = False
+        self.__killed: set[tuple] = set()
+        self.__visited: set[tuple] = set()
+        self.__seen: dict[tuple, int] = {}  # percept bits stored when a cell is visited
+        self.__safe: dict[tuple, int] = {}
+
+    def _hazards_at(self, cells):
+        """PIT / WUMPUS bits of the given cell indexes, straight from the hash."""
+        pits = _hash_uniforms(self._seed, cells, _PIT)[0] < self.pit_prob
+        wumpus = ~pits & (_hash_uniforms(self._seed, cells, _WUMPUS)[0] < self.wumpus_prob)
+        bits = pits * PIT | wumpus * WUMPUS
+        bits[cells == 0] = 0  # never at (0, 0)
+        return bits.astype(np.uint8)
+
+    def _chunk(self, cx, cy):
+        key = (cx, cy)
+        chunk = self._chunks.get(key)
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+            return chunk
+        C, N = self.chunk_size, self.__N
+        xs = np.arange(cx * C, cx * C + C)
+        ys = np.arange(cy * C, cy * C + C)
+        # cells past the edge hash like any other, has_* never reads them
+        chunk = self._hazards_at((ys[:, None] * N + xs[None, :]).ravel()).tobytes()
+        self._chunks[key] = chunk
+        self.chunk_misses += 1
+        if len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+        return chunk
+
+    def _hazard(self, x, y):
+        C = self.chunk_size
+        return self._chunk(x // C, y // C)[(y % C) * C + x % C]
+
+    def get_agent_pos(self):
+        return self.__agent_pos
+    def get_agent_dir(self):
+        return self.__agent_dir
+    def get_scream(self):
+        return self.__scream
+
+    def reset_scream(self):
+        self.__scream = False
+
+    def get_size(self):
+        return self.__N
+
+    def snapshot(self):
+        """Everything the agent changed, sized by the explored area."""
+        return (frozenset(self.__killed), frozenset(self.__visited), dict(self.__seen), dict(self.__safe),
+                self.__gold_taken, self.__agent_pos, self.__agent_dir, self.__scream)
+
+    def reset(self, snapshot=None):
+        """Back to a snapshot(), by default the untouched world. The chunk cache is kept."""
+        if snapshot is None:
+            snapshot = (frozenset(), frozenset(), {}, {}, False, (0, 0), 'E', False)
+        killed, visited, seen, safe, self.__gold_taken, self.__agent_pos, self.__agent_dir, self.__scream = snapshot
+        self.__killed = set(killed)
+        self.__visited = set(visited)
+        self.__seen = dict(seen)
+        self.__safe = dict(safe)
+
+    def clone(self):
+        """Same world and state; hazards are pure, so the clone shares the chunk cache."""
+        twin = type(self).__new__(type(self))
+        twin.__dict__.update(self.__dict__)
+        twin.reset(self.snapshot())
+        return twin
+
+    def arrow_target(self, x=None, y=None, direction=None):
+        """First live wumpus an arrow from (x, y) would hit, N towards decreasing y as in Environment.
+        The path is hashed a segment at a time without touching the chunk cache."""
+        if x is None:
+            (x, y), direction = self.__agent_pos, self.__agent_dir
+        dx, dy = {'N': (0, -1), 'S': (0, 1), 'E': (1, 0), 'W': (-1, 0)}.get(direction, (0, 0))
+        if (dx, dy) == (0, 0):
+            return None
+        N = self.__N
+        # cells left before the edge in the direction of flight
+        remaining = (N - 1 - x if dx > 0 else x) if dx else (N - 1 - y if dy > 0 else y)
+        done = 0
+        while done < remaining:
+            k = np.arange(done + 1, min(remaining, done + _ARROW_SEGMENT) + 1)
+            xs, ys = x + dx * k, y + dy * k
+            hits = np.flatnonzero(self._hazards_at(ys * N + xs) & WUMPUS)
+            for j in hits:
+                cell = (int(xs[j]), int(ys[j]))
+                if cell not in self.__killed:
+                    return cell
+            done += len(k)
+        return None
+
+    def shot_wumpus(self):
+        target = self.arrow_target()
+        if target is None:
+            return False
+        self.__scream = True
+        self.__killed.add(target)
+        return True
+
+    def grabbed_gold(self):
+        self.__gold_taken = True
+
+    def set_agent_pos_and_dir(self, x, y, direction):
+        if 0 <= x < self.__N and 0 <= y < self.__N:
+            self.__agent_pos = (x, y)
+            self.__agent_dir = direction
+        else:
+            raise ValueError("Agent position out of bounds")
+
+    def set_safe(self, x, y):
+        self.__safe[(x, y)] = SAFE
+    def set_dangerous(self, x, y):
+        self.__safe[(x, y)] = DANGEROUS
+
+    def has_pit(self, x, y):
+        if 0 <= x < self.__N and 0 <= y < self.__N:
+            return bool(self._hazard(x, y) & PIT)
+        return False
+    def has_wumpus(self, x, y):
+        if 0 <= x < self.__N and 0 <= y < self.__N:
+            return bool(self._hazard(x, y) & WUMPUS) and (x, y) not in self.__killed
+        return False
+
+    def has_gold(self, x, y):
+        return (x, y) == self.__gold_pos and not self.__gold_taken
+
+    def is_visited(self, x, y):
+        return (x, y) in self.__visited
+
+    def mark_visited(self, x, y):
+        if 0 <= x < self.__N and 0 <= y < self.__N:
+            self.__visited.add((x, y))
+            self.__seen[(x, y)] = self.get_percept_bits(x, y)
+
+    def reset_visited_cells(self):
+        """Reset all visited markers and put the gold back"""
+        self.__visited = set()
+        self.__seen = {}
+        self.__gold_taken = False
+
+    def get_cell_percepts(self, x, y):
+        """Get the stored percepts for a visited cell"""
+        return PERCEPTS[self.__seen.get((x, y), 0)]
+
+    def get_percepts(self, x, y):
+        """Read-only {'stench', 'breeze', 'glitter'} record, shared between calls."""
+        return PERCEPTS[self.get_percept_bits(x, y)]
+
+    def get_percept_bits(self, x, y):
+        if not (0 <= x < self.__N and 0 <= y < self.__N):
+            raise IndexError(f"cell ({x}, {y}) is outside the {self.__N}x{self.__N} grid")
+        bits = GLITTER if self.has_gold(x, y) else 0
+        for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if 0 <= nx < self.__N and 0 <= ny < self.__N:
+                hazard = self._hazard(nx, ny)
+                if hazard & PIT:
+                    bits |= BREEZE
+                if hazard & WUMPUS and (nx, ny) not in self.__killed:
+                    bits |= STENCH
+        return bits
+
+    def print_environment_state(self, radius=6):
+        """Prints the window of the grid around the agent."""
+        ax, ay = self.__agent_pos
+        print(f"Grid size: {self.__N}x{self.__N}, cached chunks: {len(self._chunks)}")
+        print(f"Agent position: {self.__agent_pos}, direction: {self.__agent_dir}")
+        print(f"Scream: {self.__scream}")
+        print(f"Wumpus killed: {len(self.__killed)}")
+        for y in range(max(0, ay - radius), min(self.__N, ay + radius + 1)):
+            row = []
+            for x in range(max(0, ax - radius), min(self.__N, ax + radius + 1)):
+                cell_str = ("W" if self.has_wumpus(x, y) else "") + ("P" if self.has_pit(x, y) else "") \
+                    + ("G" if self.has_gold(x, y) else "")
+                row.append(cell_str.ljust(3) if cell_str else ".  ")
+            print(" ".join(row))
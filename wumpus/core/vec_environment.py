@@ -0,0 +1,184 @@
+import numpy as np
+from .environment import Environment, STENCH, BREEZE, GLITTER
+from ..config.settings import DEATH_PENALTY, GOLD_REWARD, GRAB_REWARD, ARROW_COST, MOVE_COST
+
+# Actions, one int per world and step
+FORWARD, TURN_LEFT, TURN_RIGHT, GRAB, SHOOT, CLIMB = range(6)
+# Extra observation bits next to STENCH | BREEZE | GLITTER
+BUMP, SCREAM = 8, 16
+
+# Headings are indexes into settings.DIRECTIONS: N, E, S, W (agents start facing E)
+# Agent.move_forward walks N towards increasing y ...
+MOVE_DX = np.array([0, 1, 0, -1])
+MOVE_DY = np.array([1, 0, -1, 0])
+# ... while Environment.shot_wumpus flies N towards decreasing y
+ARROW_DX = np.array([0, 1, 0, -1])
+ARROW_DY = np.array([-1, 0, 1, 0])
+
+
+def _adjacent_any(planes):
+    """For (k, N, N) boolean planes, True where a 4-neighbour is True."""
+    out = np.zeros_like(planes)
+    out[:, 1:, :] |= planes[:, :-1, :]
+    out[:, :-1, :] |= planes[:, 1:, :]
+    out[:, :, 1:] |= planes[:, :, :-1]
+    out[:, :, :-1] |= planes[:, :, 1:]
+    return out
+
+
+class VecEnvironment:
+    """
+    B worlds of the same size stepped together, one action per world and step.
+    Rules and scoring follow Environment plus the Agent action methods: every action
+    counts a step, turns and moves cost MOVE_COST, walking into a pit or live wumpus
+    dies, the single arrow costs ARROW_COST and kills the first wumpus on its path.
+    GRAB only succeeds on the gold and CLIMB only at (0, 0); both do nothing elsewhere.
+    A world is done once its agent died or climbed out, later actions are ignored.
+    """
+
+    def __init__(self, B, N=8, K=2, pit_prob=0.2):
+        self.B, self.N, self.K, self.pit_prob = B, N, K, pit_prob
+        self.pits = np.zeros((B, N, N), dtype=bool)
+        self.wumpus = np.zeros((B, N, N), dtype=bool)
+        self.gold = np.zeros((B, N, N), dtype=bool)
+        self.stench = np.zeros((B, N, N), dtype=bool)
+        self.breeze = np.zeros((B, N, N), dtype=bool)
+        self.x = np.zeros(B, dtype=np.int64)
+        self.y = np.zeros(B, dtype=np.int64)
+        self.heading = np.ones(B, dtype=np.int64)
+        self.alive = np.ones(B, dtype=bool)
+        self.has_gold = np.zeros(B, dtype=bool)
+        self.has_arrow = np.ones(B, dtype=bool)
+        self.done = np.zeros(B, dtype=bool)
+        self.score = np.zeros(B, dtype=np.int64)
+        self.steps = np.zeros(B, dtype=np.int64)
+        self._rows = np.arange(B)
+
+    @classmethod
+    def from_environments(cls, envs, K=2, pit_prob=0.2):
+        """
+        Stack existing worlds, which must share one size. Their agent state is not copied.
+        K and pit_prob are what reset() generates new worlds with.
+        """
+        N = envs[0].get_size()
+        vec = cls(len(envs), N, K, pit_prob)
+        vec._load(np.arange(len(envs)), envs)
+        return vec
+
+    @classmethod
+    def from_batch(cls, batch, K=None, pit_prob=None):
+        """Step the worlds of a world_generator.WorldBatch, reset() keeps its K and pit_prob unless given."""
+        B, N = batch.pits.shape[:2]
+        K = batch.K if K is None else K
+        pit_prob = batch.pit_prob if pit_prob is None else pit_prob
+        vec = cls(B, N, **{name: value for name, value in (('K', K), ('pit_prob', pit_prob)) if value is not None})
+        vec.pits[:], vec.wumpus[:], vec.gold[:] = batch.pits, batch.wumpus, batch.gold
+        vec.stench[:] = _adjacent_any(vec.wumpus)
+        vec.breeze[:] = _adjacent_any(vec.pits)
+        return vec
+
+    def reset(self, seeds, indices=None):
+        """
+        Regenerate worlds from seeds, with the same layout Environment(N, K, pit_prob, seed) has,
+        and put their agents back at the start. indices picks which worlds, default all.
+        Returns the observation of every world.
+        """
+        indices = self._rows if indices is None else np.asarray(indices)
+        envs = [Environment(N=self.N, K=self.K, pit_prob=self.pit_prob, seed=seed) for seed in seeds]
+        if len(envs) != len(indices):
+            raise ValueError(f"got {len(envs)} seeds for {len(indices)} worlds")
+        self._load(indices, envs)
+        return self.observe()
+
+    def _load(self, indices, envs):
+        planes = [env.get_hazard_planes() for env in envs]
+        shape = (len(envs), self.N, self.N)
+        for target, k in ((self.pits, 0), (self.wumpus, 1), (self.gold, 2)):
+            target[indices] = np.frombuffer(b"".join(p[k] for p in planes), dtype=np.uint8).reshape(shape).astype(bool)
+        self.stench[indices] = _adjacent_any(self.wumpus[indices])
+        self.breeze[indices] = _adjacent_any(self.pits[indices])
+        self.x[indices] = 0
+        self.y[indices] = 0
+        self.heading[indices] = 1
+        self.alive[indices] = True
+        self.has_gold[indices] = False
+        self.has_arrow[indices] = True
+        self.done[indices] = False
+        self.score[indices] = 0
+        self.steps[indices] = 0
+
+    def observe(self, bump=None, scream=None):
+        """Percept bits (STENCH | BREEZE | GLITTER, plus BUMP | SCREAM) at every agent."""
+        at = (self._rows, self.y, self.x)
+        obs = (self.stench[at] * STENCH | self.breeze[at] * BREEZE | self.gold[at] * GLITTER).astype(np.uint8)
+        if bump is not None:
+            obs |= (bump * BUMP).astype(np.uint8)
+        if scream is not None:
+            obs |= (scream * SCREAM).astype(np.uint8)
+        return obs
+
+    def step(self, actions):
+        """Apply one action per world, returns (observations, rewards, done)."""
+        actions = np.asarray(actions)
+        live = ~self.done
+        reward = np.zeros(self.B, dtype=np.int64)
+        self.steps[live] += 1
+
+        turn = live & (actions == TURN_LEFT)
+        self.heading[turn] = (self.heading[turn] + 3) % 4
+        reward[turn] += MOVE_COST
+        turn = live & (actions == TURN_RIGHT)
+        self.heading[turn] = (self.heading[turn] + 1) % 4
+        reward[turn] += MOVE_COST
+
+        forward = live & (actions == FORWARD)
+        nx = self.x + MOVE_DX[self.heading]
+        ny = self.y + MOVE_DY[self.heading]
+        inside = (nx >= 0) & (nx < self.N) & (ny >= 0) & (ny < self.N)
+        moved = forward & inside
+        bump = forward & ~inside
+        self.x[moved] = nx[moved]
+        self.y[moved] = ny[moved]
+        reward[forward] += MOVE_COST
+        at = (self._rows, self.y, self.x)
+        died = moved & (self.pits[at] | self.wumpus[at])
+        self.alive[died] = False
+        self.done[died] = True
+        reward[died] += DEATH_PENALTY
+
+        grab = live & (actions == GRAB) & self.gold[at]
+        self.gold[self._rows[grab], self.y[grab], self.x[grab]] = False
+        self.has_gold[grab] = True
+        reward[grab] += GRAB_REWARD
+
+        scream = np.zeros(self.B, dtype=bool)
+        shoot = live & (actions == SHOOT) & self.has_arrow
+        if shoot.any():
+            self.has_arrow[shoot] = False
+            reward[shoot] += ARROW_COST
+            self._resolve_arrows(np.nonzero(shoot)[0], scream)
+
+        climb = live & (actions == CLIMB) & (self.x == 0) & (self.y == 0)
+        reward[climb] += GOLD_REWARD * self.has_gold[climb]
+        self.done[climb] = True
+
+        self.score += reward
+        return self.observe(bump, scream), reward, self.done.copy()
+
+    def _resolve_arrows(self, shooters, scream):
+        """Kill the first wumpus in line for each shooter, then refresh their stench planes."""
+        k = np.arange(1, self.N)
+        h = self.heading[shooters]
+        xs = self.x[shooters, None] + ARROW_DX[h, None] * k
+        ys = self.y[shooters, None] + ARROW_DY[h, None] * k
+        inside = (xs >= 0) & (xs < self.N) & (ys >= 0) & (ys < self.N)
+        hit = inside & self.wumpus[shooters[:, None], ys.clip(0, self.N - 1), xs.clip(0, self.N - 1)]
+        any_hit = hit.any(axis=1)
+        if not any_hit.any():
+            return
+        first = hit.argmax(axis=1)[any_hit]
+        killers = shooters[any_hit]
+        rows = np.nonzero(any_hit)[0]
+        self.wumpus[killers, ys[rows, first], xs[rows, first]] = False
+        self.stench[killers] = _adjacent_any(self.wumpus[killers])
+        scream[killers] = True
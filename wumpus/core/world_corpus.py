@@ -0,0 +1,151 @@
+import mmap
+import os
+import pickle
+import struct
+import weakref
+from typing import Iterable
+import numpy as np
+from .environment import Environment, RECORD_HEADER, RECORD_VERSION, record_size
+from .world_generator import WorldBatch
+
+# File header: magic, corpus version, N, number of records; fixed-size records follow
+CORPUS_MAGIC = b"WUMPUSWC"
+CORPUS_VERSION = 1
+CORPUS_HEADER = struct.Struct("<8sHHQ")
+
+
+def _record_dtype(N):
+    """numpy view of one record, field for field the layout of environment.RECORD_HEADER plus planes."""
+    size = (N * N + 7) // 8
+    return np.dtype([('version', 'u1'), ('pad', 'u1'), ('N', '<u2'), ('gold', '<i4'), ('seed', '<u8'),
+                     ('pits', 'u1', (size,)), ('wumpus', 'u1', (size,))])
+
+
+def batch_records(batch: WorldBatch) -> bytes:
+    """Records for every world of a WorldBatch, packed in one go."""
+    B, N = batch.pits.shape[:2]
+    records = np.zeros(B, dtype=_record_dtype(N))
+    records['version'] = RECORD_VERSION
+    records['N'] = N
+    records['gold'] = np.where(batch.gold.reshape(B, -1).any(axis=1), batch.gold.reshape(B, -1).argmax(axis=1), -1)
+    records['seed'] = batch.seeds.astype(np.uint64)
+    records['pits'] = np.packbits(batch.pits.reshape(B, -1), axis=1, bitorder='little')
+    records['wumpus'] = np.packbits(batch.wumpus.reshape(B, -1), axis=1, bitorder='little')
+    return records.tobytes()
+
+
+def write_corpus(path, N, records: Iterable[bytes]) -> int:
+    """
+    Stream records (Environment.to_record() or batch_records() chunks) into a corpus file,
+    returns how many were written. The count in the header is filled in at the end.
+    """
+    size = record_size(N)
+    count = 0
+    with open(path, "wb") as f:
+        f.write(CORPUS_HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, N, 0))
+        for chunk in records:
+            if len(chunk) % size:
+                raise ValueError(f"records for N={N} are {size} bytes, got a chunk of {len(chunk)}")
+            f.write(chunk)
+            count += len(chunk) // size
+        f.seek(0)
+        f.write(CORPUS_HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, N, count))
+    return count
+
+
+def convert_pickles(paths, out_path) -> int:
+    """Corpus from pickled Environment files, which must share one size. Empty files are skipped."""
+    envs = []
+    for path in paths:
+        if os.path.getsize(path) == 0:
+            continue
+        with open(path, "rb") as f:
+            envs.append(pickle.load(f))
+    if not envs:
+        raise ValueError("no environments to convert")
+    return write_corpus(out_path, envs[0].get_size(), (env.to_record() for env in envs))
+
+
+class WorldCorpus:
+    """
+    Read-only, memory-mapped corpus of world records. record(i) is a zero-copy view into
+    the mapping, so many worker processes opening the same file share one copy in the page
+    cache. Pickling a corpus only carries its path, each process maps the file itself.
+    close() releases every record view handed out, copy what must outlive the corpus.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < CORPUS_HEADER.size:
+            raise ValueError(f"{path} is not a world corpus")
+        magic, version, self.N, self.count = CORPUS_HEADER.unpack_from(self._mmap)
+        if magic != CORPUS_MAGIC:
+            raise ValueError(f"{path} is not a world corpus")
+        if version != CORPUS_VERSION:
+            raise ValueError(f"unsupported corpus version {version}")
+        self.record_size = record_size(self.N)
+        if len(self._mmap) < CORPUS_HEADER.size + self.count * self.record_size:
+            raise ValueError(f"{path} is truncated")
+        self._view = memoryview(self._mmap)
+        self._exported = weakref.WeakSet()  # record views still alive, released by close()
+        self._records = np.frombuffer(self._mmap, dtype=_record_dtype(self.N), count=self.count,
+                                      offset=CORPUS_HEADER.size)
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._records = None
+        for view in list(self._exported):
+            view.release()
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # views sliced from a record are still alive, the mapping goes away with the last one
+            pass
+
+    def record(self, i) -> memoryview:
+        if not -self.count <= i < self.count:
+            raise IndexError("world index out of range")
+        i %= self.count
+        start = CORPUS_HEADER.size + i * self.record_size
+        view = self._view[start:start + self.record_size]
+        self._exported.add(view)
+        return view
+
+    def seed(self, i) -> int:
+        return RECORD_HEADER.unpack_from(self.record(i))[3]
+
+    def environment(self, i) -> Environment:
+        return Environment.from_record(self.record(i))
+
+    def __getitem__(self, i) -> Environment:
+        return self.environment(i)
+
+    def batch(self, start, stop) -> WorldBatch:
+        """Worlds start..stop as boolean planes, unpacked straight from the mapping."""
+        records = self._records[start:stop]
+        B, N = len(records), self.N
+        cells = N * N
+        pits = np.unpackbits(records['pits'], axis=1, count=cells, bitorder='little').astype(bool)
+        wumpus = np.unpackbits(records['wumpus'], axis=1, count=cells, bitorder='little').astype(bool)
+        gold = np.zeros((B, cells), dtype=bool)
+        has_gold = records['gold'] >= 0
+        gold[np.nonzero(has_gold)[0], records['gold'][has_gold]] = True
+        shape = (B, N, N)
+        return WorldBatch(records['seed'].copy(), pits.reshape(shape), wumpus.reshape(shape), gold.reshape(shape))
@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from typing import Iterator
+import numpy as np
+from .environment import Environment
+from .vec_environment import _adjacent_any
+from .seeding import SeedStream, _GOLDEN, _mix
+from ..config.settings import DEFAULT_PIT_PROBABILITY, DEFAULT_WUMPUS_COUNT
+
+# Independent draws per cell: pit test, wumpus order, gold order
+_PIT, _WUMPUS, _GOLD = range(3)
+
+
+def _hash_uniforms(seeds, cells, stream):
+    """(B, len(cells)) floats in [0, 1), a pure function of (seed, cell index, stream)."""
+    with np.errstate(over='ignore'):
+        base = _mix(seeds.astype(np.uint64) * _GOLDEN + np.uint64(stream))
+        z = _mix(base[:, None] + (cells.astype(np.uint64) + np.uint64(1)) * _GOLDEN)
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _uniforms(seeds, cells, stream):
+    return _hash_uniforms(seeds, np.arange(cells, dtype=np.uint64), stream)
+
+
+def _flood(start, passable, expand_from):
+    """Grow start into passable cells, stepping only out of cells in expand_from."""
+    reached = start & passable
+    active = np.arange(len(reached))  # worlds still growing
+    while len(active):
+        part = reached[active]
+        grown = part | (_adjacent_any(part & expand_from[active]) & passable[active])
+        changed = (grown != part).any(axis=(1, 2))
+        active = active[changed]
+        reached[active] = grown[changed]
+    return reached
+
+
+@dataclass
+class WorldBatch:
+    """Worlds that passed the filters, as (B, N, N) boolean planes indexed [world, y, x]."""
+    seeds: np.ndarray
+    pits: np.ndarray
+    wumpus: np.ndarray
+    gold: np.ndarray
+    # settings the worlds were sampled with, None when unknown
+    K: int = None
+    pit_prob: float = None
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def environment(self, i) -> Environment:
+        N = self.pits.shape[1]
+        return Environment.from_planes(N, *(plane[i].astype(np.uint8).tobytes() for plane in (self.pits, self.wumpus, self.gold)))
+
+    def environments(self) -> Iterator[Environment]:
+        for i in range(len(self)):
+            yield self.environment(i)
+
+
+def sample_worlds(seeds, N=8, K=DEFAULT_WUMPUS_COUNT, pit_prob=DEFAULT_PIT_PROBABILITY):
+    """
+    Unfiltered worlds for the given seeds, sampled for all of them at once. Pits fall on every
+    cell but (0, 0) with pit_prob, the K wumpuses and the gold go to the lowest random keys among
+    the cells still free, matching Environment's placement rules without its rejection loops.
+    Returns a WorldBatch and a mask of worlds with too few free cells for K wumpuses.
+    """
+    seeds = np.asarray(seeds, dtype=np.uint64)
+    B, cells = len(seeds), N * N
+    pits = _uniforms(seeds, cells, _PIT) < pit_prob
+    pits[:, 0] = False
+
+    keys = _uniforms(seeds, cells, _WUMPUS)
+    keys[pits] = np.inf
+    keys[:, 0] = np.inf
+    wumpus = np.zeros((B, cells), dtype=bool)
+    if K:
+        picks = np.argpartition(keys, K - 1, axis=1)[:, :K] if K < cells else np.argsort(keys, axis=1)[:, :K]
+        valid = np.isfinite(np.take_along_axis(keys, picks, axis=1)).all(axis=1)
+        wumpus[np.arange(B)[:, None], picks] = True
+    else:
+        valid = np.ones(B, dtype=bool)
+
+    keys = _uniforms(seeds, cells, _GOLD)
+    keys[pits | wumpus] = np.inf
+    gold = np.zeros((B, cells), dtype=bool)
+    gold[np.arange(B), keys.argmin(axis=1)] = True
+    valid &= np.isfinite(keys.min(axis=1))
+
+    shape = (B, N, N)
+    return WorldBatch(seeds, pits.reshape(shape), wumpus.reshape(shape), gold.reshape(shape), K, pit_prob), valid
+
+
+def generate_worlds(N=8, K=DEFAULT_WUMPUS_COUNT, pit_prob=DEFAULT_PIT_PROBABILITY, start=0, count=None,
+                    batch_size=4096, reachable=False, solvable=False, min_hazards=0, max_hazards=None,
+                    stream: SeedStream = None) -> Iterator[WorldBatch]:
+    """
+    Lazy stream of WorldBatch, trying seeds start, start + 1, ... until count worlds passed
+    (forever if count is None), or the seeds of worlds start, start + 1, ... of a SeedStream.
+    Each world only depends on its own seed, so any of them can be rebuilt alone with
+    sample_worlds([seed], ...).
+
+    reachable:  the gold can be walked to from (0, 0) without entering a pit or wumpus.
+    solvable:   the gold can be reached without guessing, only stepping into cells next to a
+                visited cell that had neither stench nor breeze.
+    min_hazards / max_hazards bound the number of pits plus wumpuses.
+    """
+    seed, accepted = start, 0
+    origin = np.zeros((1, N, N), dtype=bool)
+    origin[0, 0, 0] = True
+    while count is None or accepted < count:
+        seeds = np.arange(seed, seed + batch_size) if stream is None else stream.world_seeds(seed, batch_size)
+        batch, keep = sample_worlds(seeds, N, K, pit_prob)
+        seed += batch_size
+        hazards = batch.pits | batch.wumpus
+        counts = hazards.sum(axis=(1, 2))
+        keep &= counts >= min_hazards
+        if max_hazards is not None:
+            keep &= counts <= max_hazards
+        if reachable and keep.any():
+            free = ~hazards[keep]
+            reached = _flood(np.broadcast_to(origin, free.shape), free, free)
+            keep[keep] = (reached & batch.gold[keep]).any(axis=(1, 2))
+        if solvable and keep.any():
+            free = ~hazards[keep]
+            quiet = ~(_adjacent_any(hazards[keep]))
+            reached = _flood(np.broadcast_to(origin, free.shape), free, quiet)
+            keep[keep] = (reached & batch.gold[keep]).any(axis=(1, 2))
+
+        index = np.nonzero(keep)[0]
+        if count is not None:
+            index = index[:count - accepted]
+        if len(index):
+            accepted += len(index)
+            yield WorldBatch(batch.seeds[index], batch.pits[index], batch.wumpus[index], batch.gold[index], K, pit_prob)
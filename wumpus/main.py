@@ -6,14 +6,11 @@ def run_console():
     env = Environment(N=4)
     agent = RandomAgent(env)
 
-    steps = 0
-    while agent.step():
-        steps += 1
-        if steps > 100:
-            print("Agent took too long!")
-            break
+    result = agent.run_episode(max_steps=100, on_event=lambda event: print(event.message))
+    if result.outcome == 'timeout':
+        print("Agent took too long!")
 
-    print(f"Final Score: {agent.score}")
+    print(f"Final Score: {result.score}")
 
 def run_gui():
     from .GUI.game_board_clean import GameBoardUI
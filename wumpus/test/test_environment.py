@@ -0,0 +1,360 @@
+from ..core.environment import Environment, STENCH, BREEZE, GLITTER
+from ..core.vec_environment import VecEnvironment, FORWARD, TURN_LEFT, TURN_RIGHT, GRAB, SHOOT, CLIMB, BUMP
+from ..core.world_generator import generate_worlds, sample_worlds
+from ..core.world_corpus import WorldCorpus, write_corpus, batch_records, convert_pickles
+from ..core.sparse_environment import SparseEnvironment
+from ..core.seeding import SeedStream, WorldKey
+from ..agents.random_agent import RandomAgent
+from ..agents.hybrid_agent import HybridAgent
+from ..ai.knowledge_base import KnowledgeBase
+from ..ai.inference_engine import InferenceEngine
+from ..ai.planning_module import PlanningModule
+import os
+import tempfile
+import pickle
+import random
+
+
+def test_legacy_pickle():
+    # saved before the bytearray planes, still a grid of Cell objects
+    with open("saved_envs/comfy_map.pkl", "rb") as f:
+        env = pickle.load(f)
+    assert env.get_size() == 8 and env.get_agent_pos() == (4, 7)
+    assert env.has_pit(1, 0) and env.has_wumpus(6, 0) and env.has_gold(1, 3)
+    assert env.is_visited(0, 0) and env.get_cell_percepts(0, 0)['breeze'], "Stored percepts lost"
+    assert not env.is_visited(1, 0)
+
+    clone = pickle.loads(pickle.dumps(env))
+    n = env.get_size()
+    for y in range(n):
+        for x in range(n):
+            assert clone.get_percepts(x, y) == env.get_percepts(x, y)
+            assert clone.get_cell_percepts(x, y) == env.get_cell_percepts(x, y)
+    print("test_legacy_pickle passed.")
+
+
+def test_planes():
+    env = Environment(N=6, K=2, pit_prob=0.2, seed=3)
+    assert not env.has_pit(0, 0) and not env.has_wumpus(0, 0)
+    assert not env.has_pit(-1, 0) and not env.has_gold(6, 6), "Out of bounds must read as empty"
+    wumpuses = [(x, y) for y in range(6) for x in range(6) if env.has_wumpus(x, y)]
+    assert len(wumpuses) == 2
+
+    env.mark_visited(2, 2)
+    stored = env.get_cell_percepts(2, 2)
+    assert stored == env.get_percepts(2, 2) and env.is_visited(2, 2)
+    env.reset_visited_cells()
+    assert not env.is_visited(2, 2) and env.get_cell_percepts(2, 2) == {'stench': False, 'breeze': False, 'glitter': False}
+    print("test_planes passed.")
+
+
+def test_percept_planes():
+    env = Environment(N=8, K=2, pit_prob=0.2, seed=4)
+    n = env.get_size()
+    wumpus = next((x, y) for y in range(n) for x in range(n) if env.has_wumpus(x, y))
+    for y in range(n):
+        for x in range(n):
+            adj = [(x + dx, y + dy) for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]]
+            expected = {
+                'stench': any(env.has_wumpus(*c) for c in adj),
+                'breeze': any(env.has_pit(*c) for c in adj),
+                'glitter': env.has_gold(x, y),
+            }
+            assert env.get_percepts(x, y) == expected, f"Wrong percepts at {(x, y)}"
+            bits = env.get_percept_bits(x, y)
+            assert bool(bits & STENCH) == expected['stench'] and bool(bits & BREEZE) == expected['breeze']
+    assert env.get_percepts(0, 0) is env.get_percepts(0, 0), "Percept record is rebuilt per call"
+    # off the grid the flat index would wrap onto a neighbouring row
+    for cell in [(n, 0), (-1, 1), (0, n), (0, -1)]:
+        for read in (env.get_percepts, env.get_percept_bits):
+            try:
+                read(*cell)
+                assert False, f"{read.__name__} accepted off-grid cell {cell}"
+            except IndexError:
+                pass
+
+    # shoot the wumpus from the cell below it, its stench must go unless another wumpus is adjacent
+    wx, wy = wumpus
+    shooter = (wx, wy + 1) if wy + 1 < n else (wx, wy - 1)
+    env.set_agent_pos_and_dir(*shooter, 'N' if shooter[1] > wy else 'S')
+    assert env.shot_wumpus()
+    for cx, cy in [(wx - 1, wy), (wx + 1, wy), (wx, wy - 1), (wx, wy + 1)]:
+        if 0 <= cx < n and 0 <= cy < n:
+            still = any(env.has_wumpus(cx + dx, cy + dy) for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)])
+            assert env.get_percepts(cx, cy)['stench'] == still
+
+    gx, gy = next((x, y) for y in range(n) for x in range(n) if env.has_gold(x, y))
+    env.grabbed_gold()
+    assert not env.get_percept_bits(gx, gy) & GLITTER
+    env.reset_visited_cells()
+    assert env.get_percepts(gx, gy)['glitter']
+    print("test_percept_planes passed.")
+
+
+def test_vec_environment():
+    # random action sequences on both sides, grab only on glitter and climb only at the entrance
+    seeds = list(range(24))
+    vec = VecEnvironment(len(seeds), N=6, K=2, pit_prob=0.2)
+    obs = vec.reset(seeds)
+    agents = [RandomAgent(Environment(N=6, K=2, pit_prob=0.2, seed=seed)) for seed in seeds]
+    rng = random.Random(7)
+    for _ in range(60):
+        actions = []
+        for b, agent in enumerate(agents):
+            assert obs[b] & 7 == agent.env.get_percept_bits(agent.x, agent.y), f"World {b} percepts differ"
+            choice = rng.choice([FORWARD, FORWARD, FORWARD, TURN_LEFT, TURN_RIGHT, SHOOT])
+            if obs[b] & GLITTER:
+                choice = GRAB
+            elif (agent.x, agent.y) == (0, 0) and agent.has_gold:
+                choice = CLIMB
+            actions.append(choice)
+            if vec.done[b]:
+                continue
+            before = (agent.x, agent.y)
+            {FORWARD: agent.move_forward, TURN_LEFT: agent.turn_left, TURN_RIGHT: agent.turn_right,
+             GRAB: agent.grab_gold, SHOOT: agent.shoot, CLIMB: agent.climb_out}[choice]()
+            agent.bumped = choice == FORWARD and before == (agent.x, agent.y)
+        finished = vec.done.copy()
+        obs, _, _ = vec.step(actions)
+        for b, agent in enumerate(agents):
+            if finished[b]:
+                continue
+            assert (vec.x[b], vec.y[b]) == (agent.x, agent.y) and vec.score[b] == agent.score, f"World {b} diverged"
+            assert vec.alive[b] == agent.alive and vec.has_gold[b] == agent.has_gold
+            assert bool(obs[b] & BUMP) == (actions[b] == FORWARD and agent.bumped)
+
+    # the other constructors keep the generation settings, so reset() rebuilds the same worlds
+    envs = [Environment(N=6, K=1, pit_prob=0.1, seed=seed) for seed in seeds]
+    vec = VecEnvironment.from_environments(envs, K=1, pit_prob=0.1)
+    pits, wumpus = vec.pits.copy(), vec.wumpus.copy()
+    vec.reset(seeds)
+    assert (vec.pits == pits).all() and (vec.wumpus == wumpus).all(), "reset() used other settings"
+    batch, _ = sample_worlds(seeds, N=6, K=1, pit_prob=0.1)
+    assert (VecEnvironment.from_batch(batch).K, VecEnvironment.from_batch(batch).pit_prob) == (1, 0.1)
+    print("test_vec_environment passed.")
+
+
+def _walk(env, through):
+    """Cells reachable from (0, 0), stepping out of a cell only when through(x, y) allows it."""
+    n = env.get_size()
+    seen, todo = {(0, 0)}, [(0, 0)]
+    while todo:
+        x, y = todo.pop()
+        if not through(x, y):
+            continue
+        for nb in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+            if 0 <= nb[0] < n and 0 <= nb[1] < n and nb not in seen and not env.has_pit(*nb) and not env.has_wumpus(*nb):
+                seen.add(nb)
+                todo.append(nb)
+    return seen
+
+
+def test_world_generator():
+    batches = list(generate_worlds(N=6, K=2, count=300, batch_size=128, solvable=True, min_hazards=5, max_hazards=9))
+    assert sum(len(batch) for batch in batches) == 300
+    for batch in batches[:2]:
+        for i, env in enumerate(batch.environments()):
+            cells = [(x, y) for y in range(6) for x in range(6)]
+            assert not env.has_pit(0, 0) and not env.has_wumpus(0, 0)
+            assert sum(env.has_wumpus(*c) for c in cells) == 2
+            assert 5 <= sum(env.has_pit(*c) or env.has_wumpus(*c) for c in cells) <= 9
+            gold = next(c for c in cells if env.has_gold(*c))
+            assert gold in _walk(env, lambda x, y: not env.get_percept_bits(x, y) & (STENCH | BREEZE)), "Unsolvable world kept"
+
+            # every world only depends on its seed
+            alone, valid = sample_worlds([batch.seeds[i]], N=6, K=2)
+            assert valid[0] and (alone.pits[0] == batch.pits[i]).all() and (alone.gold[0] == batch.gold[i]).all()
+
+    # reachable is the weaker filter, solvable worlds always pass it
+    for batch in generate_worlds(N=6, K=2, count=200, batch_size=200, reachable=True):
+        for env in batch.environments():
+            gold = next((x, y) for y in range(6) for x in range(6) if env.has_gold(x, y))
+            assert gold in _walk(env, lambda x, y: True), "Unreachable gold kept"
+        vec = VecEnvironment.from_batch(batch)
+        assert vec.B == len(batch) and (vec.observe() == [env.get_percept_bits(0, 0) for env in batch.environments()]).all()
+    print("test_world_generator passed.")
+
+
+def test_world_corpus():
+    batch = next(generate_worlds(N=7, K=2, count=50, batch_size=64))
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "worlds.wc")
+        assert write_corpus(path, 7, [batch_records(batch)]) == len(batch)
+        with WorldCorpus(path) as corpus:
+            assert len(corpus) == len(batch)
+            for i in (0, 17, -1):
+                env = corpus[i]
+                assert env.get_hazard_planes() == batch.environment(i).get_hazard_planes()
+                assert env.to_record(corpus.seed(i)) == bytes(corpus.record(i)), "Record round trip changed bytes"
+            sliced = corpus.batch(10, 20)
+            assert (sliced.pits == batch.pits[10:20]).all() and (sliced.wumpus == batch.wumpus[10:20]).all()
+            assert (sliced.gold == batch.gold[10:20]).all() and list(sliced.seeds) == list(batch.seeds[10:20])
+            kept, copied = corpus.record(3), bytes(corpus.record(3))
+            part = corpus.record(4)[:8]
+        # closing with record views still alive releases them instead of failing, copies stay usable
+        try:
+            bytes(kept)
+            assert False, "Record view outlived the corpus"
+        except ValueError:
+            pass
+        assert copied == batch_records(batch)[3 * len(copied):4 * len(copied)]
+        assert bytes(part) == batch_records(batch)[4 * len(copied):4 * len(copied) + 8]
+
+        # stream seeds use all 64 bits, they come back unsigned
+        batch = next(generate_worlds(N=7, K=2, count=16, batch_size=16, stream=SeedStream(1234)))
+        assert any(int(seed) >= 1 << 63 for seed in batch.seeds)
+        path = os.path.join(folder, "stream.wc")
+        write_corpus(path, 7, [batch_records(batch)])
+        with WorldCorpus(path) as corpus:
+            assert [corpus.seed(i) for i in range(len(corpus))] == [int(seed) for seed in batch.seeds]
+            assert corpus.batch(0, len(corpus)).seeds.tolist() == batch.seeds.tolist()
+            assert corpus[0].to_record() == corpus[0].to_record(-1), "Unknown seed changed its bytes"
+
+        # the saved pickles, the empty ones are skipped
+        pickles = sorted(os.path.join("saved_envs", name) for name in os.listdir("saved_envs") if name.endswith(".pkl"))
+        path = os.path.join(folder, "saved.wc")
+        count = convert_pickles(pickles, path)
+        with WorldCorpus(path) as corpus:
+            assert len(corpus) == count > 0
+            with open("saved_envs/comfy_map.pkl", "rb") as f:
+                original = pickle.load(f)
+            converted = [corpus[i] for i in range(count)]
+            assert any(env.get_hazard_planes() == original.get_hazard_planes() for env in converted)
+    print("test_world_corpus passed.")
+
+
+def test_clone_and_reset():
+    env = Environment(N=8, K=2, pit_prob=0.2, seed=5)
+    n = env.get_size()
+    planes = env.get_hazard_planes()
+    wx, wy = next((x, y) for y in range(n) for x in range(n) if env.has_wumpus(x, y))
+
+    fork = env.clone()
+    shooter = (wx, wy + 1) if wy + 1 < n else (wx, wy - 1)
+    fork.set_agent_pos_and_dir(*shooter, 'N' if shooter[1] > wy else 'S')
+    assert fork.shot_wumpus() and fork.get_scream()
+    fork.grabbed_gold()
+    fork.mark_visited(1, 0)
+    fork.set_dangerous(2, 0)
+    # the original never sees the fork's writes
+    assert env.get_hazard_planes() == planes and not env.get_scream() and env.get_agent_pos() == (0, 0)
+    assert not env.is_visited(1, 0) and fork.is_visited(1, 0)
+    assert fork.get_hazard_planes() != planes
+
+    mid = fork.snapshot()
+    fork.mark_visited(3, 0)
+    fork.reset(mid)
+    assert fork.is_visited(1, 0) and not fork.is_visited(3, 0) and not fork.has_wumpus(wx, wy)
+
+    fork.reset()
+    assert fork.get_hazard_planes() == planes and not fork.get_scream() and fork.get_agent_pos() == (0, 0)
+    assert not fork.is_visited(1, 0) and fork.has_wumpus(wx, wy)
+    for y in range(n):
+        for x in range(n):
+            assert fork.get_percepts(x, y) == env.get_percepts(x, y), "Percepts not restored"
+    print("test_clone_and_reset passed.")
+
+
+def test_arrow_index():
+    rng = random.Random(2)
+    for seed in range(20):
+        env = Environment(N=9, K=6, pit_prob=0.1, seed=seed)
+        fork = env.clone()
+        for _ in range(40):
+            x, y, d = rng.randrange(9), rng.randrange(9), rng.choice('NESW')
+            dx, dy = {'N': (0, -1), 'S': (0, 1), 'E': (1, 0), 'W': (-1, 0)}[d]
+            path = [(x + dx * k, y + dy * k) for k in range(1, 9)]
+            expected = next((c for c in path if fork.has_wumpus(*c)), None)
+            assert fork.arrow_target(x, y, d) == expected, f"Wrong target from {(x, y, d)}"
+            fork.set_agent_pos_and_dir(x, y, d)
+            assert fork.shot_wumpus() == (expected is not None)
+            assert expected is None or not fork.has_wumpus(*expected)
+        # kills in the fork must not leak into the original's index
+        assert sum(env.has_wumpus(x, y) for y in range(9) for x in range(9)) == 6
+        fork.reset()
+        assert fork.get_hazard_planes() == env.get_hazard_planes()
+        assert all(fork.arrow_target(0, y, 'E') == env.arrow_target(0, y, 'E') for y in range(9))
+    print("test_arrow_index passed.")
+
+
+def test_sparse_environment():
+    env = SparseEnvironment(N=100_000, pit_prob=0.2, wumpus_prob=0.05, seed=11, chunk_size=16, max_chunks=4)
+    twin = SparseEnvironment(N=100_000, pit_prob=0.2, wumpus_prob=0.05, seed=11)
+    rng = random.Random(3)
+    far = [(rng.randrange(100_000), rng.randrange(100_000)) for _ in range(200)]
+    for x, y in far:
+        assert env.has_pit(x, y) == twin.has_pit(x, y) and env.has_wumpus(x, y) == twin.has_wumpus(x, y)
+        adj = [(x + dx, y + dy) for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]]
+        assert env.get_percepts(x, y)['breeze'] == any(env.has_pit(*c) for c in adj)
+        assert env.get_percepts(x, y)['stench'] == any(env.has_wumpus(*c) for c in adj)
+    assert len(env._chunks) <= 4, "Chunk cache outgrew its bound"
+    assert not env.has_pit(0, 0) and not env.has_wumpus(0, 0) and not env.has_pit(100_000, 0)
+
+    # arrows hit the first wumpus on the path, kills stay in the clone
+    for _ in range(50):
+        x, y, d = rng.randrange(2000), rng.randrange(2000), rng.choice('NESW')
+        dx, dy = {'N': (0, -1), 'S': (0, 1), 'E': (1, 0), 'W': (-1, 0)}[d]
+        k = 1
+        while 0 <= x + dx * k < 100_000 and 0 <= y + dy * k < 100_000 and not env.has_wumpus(x + dx * k, y + dy * k):
+            k += 1
+        expected = (x + dx * k, y + dy * k) if env.has_wumpus(x + dx * k, y + dy * k) else None
+        assert env.arrow_target(x, y, d) == expected
+    fork = env.clone()
+    fork.set_agent_pos_and_dir(x, y, d)
+    if fork.shot_wumpus():
+        assert not fork.has_wumpus(*expected) and env.has_wumpus(*expected)
+
+    # the hybrid agent runs on it through the usual accessors
+    env = SparseEnvironment(N=100_000, pit_prob=0.05, wumpus_prob=0.01, seed=2, gold_radius=40)
+    kb = KnowledgeBase()
+    agent = HybridAgent(env, kb, InferenceEngine(kb), PlanningModule())
+    result = agent.run_episode(max_steps=150)
+    assert result.steps > 0 and len(agent.visited) > 20
+    assert all(env.is_visited(*cell) for cell in agent.visited)
+    assert len(env._chunks) <= 16, "Chunks derived far from the explored area"
+    print("test_sparse_environment passed.")
+
+
+def test_seed_streams():
+    root = SeedStream(1234)
+    workers = root.spawn(3)
+    assert [w.spawn_key for w in workers] == [(0,), (1,), (2,)] and root.spawn(1)[0].spawn_key == (3,)
+    seen = set()
+    for worker in workers:
+        seeds = set(worker.world_seeds(0, 5000).tolist())
+        assert len(seeds) == 5000 and not seeds & seen, "Streams overlap"
+        seen |= seeds
+
+    # a key rebuilds the same world anywhere, the world parameters are part of the derivation
+    key = workers[1].key(7)
+    again = SeedStream(1234).spawn(2)[1].key(7)
+    assert again == key and pickle.loads(pickle.dumps(key)) == key and str(key) == "1234/1:7"
+    assert key.seed == int(workers[1].world_seeds(7, 1)[0])
+    world = Environment(N=8, K=2, pit_prob=0.2, seed=key)
+    assert world.get_hazard_planes() == Environment(N=8, K=2, pit_prob=0.2, seed=again).get_hazard_planes()
+    assert world.get_hazard_planes() != Environment(N=8, K=2, pit_prob=0.3, seed=key).get_hazard_planes()
+    assert Environment(N=8, K=2, pit_prob=0.2, seed=WorldKey(1234, (1,), 8)).get_hazard_planes() != world.get_hazard_planes()
+
+    # plain integers keep the old derivation, so saved seeds still name the same maps
+    legacy = Environment(N=8, K=2, pit_prob=0.2, seed=3)
+    assert legacy.has_wumpus(5, 1) and legacy.has_wumpus(7, 1) and legacy.has_gold(2, 6)
+
+    # the bulk generator can draw its seeds from a stream, shards never repeat a world
+    first = next(generate_worlds(N=6, K=1, count=64, batch_size=64, stream=workers[0]))
+    second = next(generate_worlds(N=6, K=1, count=64, batch_size=64, stream=workers[0]))
+    other = next(generate_worlds(N=6, K=1, count=64, batch_size=64, stream=workers[2]))
+    assert list(first.seeds) == list(second.seeds) and not set(first.seeds.tolist()) & set(other.seeds.tolist())
+    print("test_seed_streams passed.")
+
+
+if __name__ == "__main__":
+    test_legacy_pickle()
+    test_planes()
+    test_percept_planes()
+    test_vec_environment()
+    test_world_generator()
+    test_world_corpus()
+    test_clone_and_reset()
+    test_arrow_index()
+    test_sparse_environment()
+    test_seed_streams()
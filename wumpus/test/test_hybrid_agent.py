@@ -1,10 +1,15 @@
 from ..agents.hybrid_agent import HybridAgent
+from ..agents.phase_histogram import PhaseHistogram
+from ..agents.observation import ObservationEncoder, CHANNELS, VISITED, AGENT
 from ..ai.knowledge_base import KnowledgeBase
 from ..ai.inference_engine import InferenceEngine
 from ..ai.planning_module import PlanningModule 
+from ..ai.knowledge_base import load_kb_template
 from ..core.environment import Environment
 import pickle
 import os
+import tempfile
+import json
 
 
 def init_agent(map_path = None, debug = False):
@@ -41,11 +46,286 @@ def test_update_kb_and_cell_prob():
     print("test_update_kb_and_cell_prob passed.")
 
 
+def test_lazy_cell_prob():
+    agent = init_agent()
+    percepts = {'stench': False, 'breeze': True, 'glitter': False}
+    agent.x, agent.y = 1, 1
+    agent.update_kb_and_cell_prob(percepts)
+    assert agent.inference_calls == 0, "Probabilities computed before they were needed"
+    assert (1, 2) in agent.pending_probs, "Breeze neighbours not queued"
+    agent.resolve_cell_probs()
+    assert agent.inference_calls > 0 and not agent.pending_probs, "Pending probabilities not resolved"
+    assert 0 < agent.cell_prob[(1, 2)] < 1, f"Unexpected prob {agent.cell_prob[(1, 2)]}"
+    print("test_lazy_cell_prob passed.")
+
+
+def test_speculative_cell_prob():
+    agent = init_agent()
+    agent.speculative = True
+    agent.x, agent.y = 1, 1
+    agent.update_kb_and_cell_prob({'stench': False, 'breeze': True, 'glitter': False})
+    agent.speculate()
+    agent.resolve_cell_probs()
+    assert agent.speculation_hits == 1, "Speculated probabilities not used"
+    expected = agent.ie.model_check_probability("Pit(1, 2)")
+    assert agent.pit_prob[(1, 2)] == expected, f"Expected {expected}, got {agent.pit_prob[(1, 2)]}"
+
+    # a new percept after the snapshot invalidates the speculation
+    agent.x, agent.y = 2, 1
+    agent.update_kb_and_cell_prob({'stench': False, 'breeze': True, 'glitter': False})
+    agent.speculate()
+    agent.kb.add_fact("!Pit(1, 2)")
+    agent.resolve_cell_probs()
+    assert agent.speculation_misses == 1, "Stale speculation was not discarded"
+    print("test_speculative_cell_prob passed.")
+
+
+def test_step_budget_report():
+    agent = init_agent()
+    agent.step_budget = 10.0
+    agent.step()
+    report = agent.last_step_report
+    assert report is not None and report['deadline_met'], f"Unexpected report {report}"
+    assert agent.deadlines_met == 1 and agent.deadlines_missed == 0
+
+    # an expired deadline stops model checking early and keeps the cells queued
+    for cell in [(2, 2), (4, 2)]:
+        agent.x, agent.y = cell
+        agent.update_kb_and_cell_prob({'stench': True, 'breeze': True, 'glitter': False})
+    agent._deadline = 0.0
+    agent.resolve_cell_probs()
+    assert not agent.ie.last_complete, "Deadline was ignored"
+    assert agent.pending_probs, "Approximated cells must stay queued for an exact pass"
+    assert "inference" in agent._degraded
+
+    # with nothing else to do the step holds while the worker finishes the pass exactly
+    assert agent._hold() and agent._speculation is not None
+    agent._speculation[2].result()
+    agent.resolve_cell_probs()
+    assert agent.speculation_hits == 1 and not agent.pending_probs, "Exact pass was not picked up"
+    print("test_step_budget_report passed.")
+
+
+def test_step_budget_outcome():
+    # a budget the planner fits in holds a few steps at most, it never turns a won episode into giving up
+    unlimited = HybridAgent(Environment(N=8, K=1, pit_prob=0.1, seed=3)).run_episode()
+    tight = HybridAgent(Environment(N=8, K=1, pit_prob=0.1, seed=3), step_budget=1e-2).run_episode()
+    assert unlimited.outcome == 'won', f"Unexpected baseline {unlimited}"
+    assert tight.outcome == unlimited.outcome and tight.score >= unlimited.score, f"{tight} worse than {unlimited}"
+    print("test_step_budget_outcome passed.")
+
+
+def test_event_trace():
+    agent = init_agent()
+    agent.turn_left()
+    assert agent.drain_events() == [], "Events recorded while tracing is off"
+
+    received = []
+    agent.enable_trace(buffer_size=2)
+    agent.subscribe(received.append)
+    agent.turn_left()
+    agent.turn_right()
+    agent.turn_right()
+    events = agent.drain_events()
+    assert [e.kind for e in events] == ['turn_right', 'turn_right'], "Ring buffer did not drop the oldest event"
+    assert len(received) == 3 and received[0].message == f"Agent turned left to {received[0].dir}"
+    print("test_event_trace passed.")
+
+
+def test_kb_template():
+    with tempfile.TemporaryDirectory() as folder:
+        rules_path, facts_path = os.path.join(folder, "rules.txt"), os.path.join(folder, "facts.txt")
+        with open(rules_path, "w") as f:
+            f.write("Breeze(x,y) => Pit(x+1,y) | Pit(x,y+1)\n")
+        with open(facts_path, "w") as f:
+            f.write("!Pit(0,0)\n")
+        template = load_kb_template(rules_path, facts_path)
+        assert load_kb_template(rules_path, facts_path) is template, "Template parsed twice"
+
+        # same content, new mtime: the hash check keeps the parsed template
+        os.utime(facts_path, ns=(0, 0))
+        assert load_kb_template(rules_path, facts_path) is template
+
+        with open(facts_path, "w") as f:
+            f.write("!Pit(0,0)\n!Wumpus(0,0)\n")
+        reloaded = load_kb_template(rules_path, facts_path)
+        assert reloaded is not template and len(reloaded.facts) == 2, "Changed file not reloaded"
+
+        kb = reloaded.copy()
+        kb.add_fact("Breeze(1,0)")
+        assert len(reloaded.facts) == 2 and kb.facts[0] is reloaded.facts[0]
+
+    agent = init_agent()
+    assert agent.kb.facts[0] is load_kb_template().facts[0], "Agent KB does not share the template"
+    print("test_kb_template passed.")
+
+
+def test_reset_reuse():
+    def run(agent):
+        while agent.steps < 300 and agent.step():
+            pass
+        return agent.score, agent.steps, agent.alive, agent.has_gold, sorted(agent.visited)
+
+    pooled = HybridAgent(Environment(N=6, K=2, seed=7))
+    run(pooled)
+    kb, pm, uncertain = pooled.kb, pooled.pm, pooled.uncertain_cell
+    for seed in [3, 11, 12]:
+        pooled.reset(Environment(N=6, K=2, seed=seed))
+        fresh = HybridAgent(Environment(N=6, K=2, seed=seed))
+        assert len(pooled.kb.facts) == len(fresh.kb.facts) and pooled.pm.space == fresh.pm.space
+        assert run(pooled) == run(fresh), f"Reset agent diverged from a fresh one on seed {seed}"
+    assert pooled.kb is kb and pooled.pm is pm and pooled.uncertain_cell is uncertain, "Structures were reallocated"
+    print("test_reset_reuse passed.")
+
+
+def test_run_episode():
+    agent = HybridAgent(Environment(N=4, K=1, seed=3))
+    events = []
+    result = agent.run_episode(max_steps=200, on_event=events.append)
+    assert result.outcome in ('won', 'climbed_out', 'quit', 'died', 'timeout')
+    assert (result.score, result.steps, result.has_gold) == (agent.score, agent.steps, agent.has_gold)
+    assert result.arrows_used == (0 if agent.can_shoot else 1)
+    assert events and not agent.tracing, "on_event was not detached after the episode"
+    assert set(result.phase_times) <= {'percepts', 'kb_update', 'frontier', 'inference', 'planning', 'act'}
+    assert abs(sum(result.phase_times.values()) - result.elapsed) < 0.05 * result.elapsed + 0.01
+
+    agent.reset(Environment(N=4, K=1, seed=3))
+    result = agent.run_episode(max_steps=1)
+    assert result.outcome == 'timeout' and result.steps == 1, f"Unexpected {result}"
+
+    # giving up far from the entrance still walks the way back before climbing out
+    agent = HybridAgent(Environment(N=8, K=1, seed=4))
+    events = []
+    result = agent.run_episode(on_event=events.append)
+    gave_up = next(e for e in events if e.kind == 'decision' and 'giving up' in e.message)
+    assert gave_up and (agent.x, agent.y) == (0, 0) and result.outcome == 'climbed_out', f"Unexpected {result}"
+    assert events[-1].kind == 'climb' and not agent.is_exiting()
+    print("test_run_episode passed.")
+
+
+def test_step_histogram():
+    histogram = PhaseHistogram()
+    for seed in [3, 4, 5]:
+        agent = HybridAgent(Environment(N=6, K=2, seed=seed))
+        agent.enable_step_histogram(histogram)
+        agent.run_episode(max_steps=100)
+    steps = histogram.count('step')
+    assert steps > 0 and histogram.count('percepts') <= steps
+    assert 0 < histogram.percentile('step', 50) <= histogram.percentile('step', 99) <= max(histogram.bounds)
+
+    restored = PhaseHistogram.from_dict(json.loads(histogram.to_json()))
+    restored.merge(histogram)
+    assert restored.count('step') == 2 * steps and restored.maxima == histogram.maxima
+    print("test_step_histogram passed.")
+
+
+def test_observation_encoder():
+    agents = [HybridAgent(Environment(N=6, K=2, seed=seed)) for seed in [7, 11, 24]]
+    encoder = ObservationEncoder(6, batch_size=len(agents))
+    for slot, agent in enumerate(agents):
+        encoder.attach(agent, slot)
+    running = [True] * len(agents)
+    for _ in range(120):
+        for slot, agent in enumerate(agents):
+            if running[slot] and agent.alive:
+                running[slot] = agent.step()
+        planes, pose = encoder.encode()
+        assert planes.shape == (3, len(CHANNELS), 6, 6) and pose.shape == (3, 9)
+        for slot, agent in enumerate(agents):
+            full_planes, full_pose = encoder.encode_full(agent)
+            assert (planes[slot] == full_planes).all(), "Incremental planes drifted from a full rebuild"
+            assert (pose[slot] == full_pose).all()
+        if not any(running):
+            break
+    assert planes[:, VISITED].sum() == sum(len(agent.visited) for agent in agents)
+
+    # reset clears the tracked containers in place, so the slot follows the new episode
+    agents[0].reset(Environment(N=6, K=2, seed=7))
+    planes, _ = encoder.encode()
+    assert planes[0, VISITED].sum() == 1 and planes[0, AGENT, 0, 0] == 1
+    assert (planes[0] == encoder.encode_full(agents[0])[0]).all()
+    print("test_observation_encoder passed.")
+
+
+def test_snapshot_restore():
+    agent = init_agent()
+    agent.update_kb_and_cell_prob({'stench': False, 'breeze': False, 'glitter': False})
+    agent.add_adj_as_safe_cell()
+    snap = agent.snapshot()
+    facts, rules, version = len(agent.kb.facts), len(agent.kb.rules), agent.kb.version
+    space, exit_field, frontier = set(agent.pm.space), dict(agent.pm.exit_field), set(agent.pm.frontier)
+
+    # wander off and learn a few things, then rewind
+    for cell in [(1, 0), (1, 1), (2, 1)]:
+        agent.x, agent.y = cell
+        agent.visited.add(cell)
+        agent.pm.mark_visited(cell)
+        agent.update_kb_and_cell_prob({'stench': True, 'breeze': False, 'glitter': False})
+        agent.add_adj_as_safe_cell()
+    agent.pm.add_wumpus((3, 1))
+    agent.resolve_cell_probs()
+    agent.score -= 10
+    agent.restore(snap)
+
+    assert (agent.x, agent.y, agent.score) == (0, 0, 0)
+    assert (len(agent.kb.facts), len(agent.kb.rules), agent.kb.version) == (facts, rules, version)
+    assert agent.pm.space == space and agent.pm.exit_field == exit_field and agent.pm.frontier == frontier
+    assert not agent.pm.firing_positions and not agent.pm.wumpus_rows.get(1)
+    assert agent.visited == {(0, 0)} and not agent.pending_probs and not agent.uncertain_cell
+
+    # the same snapshot can be restored again after taking another branch
+    agent.x, agent.y = 0, 1
+    agent.update_kb_and_cell_prob({'stench': False, 'breeze': True, 'glitter': False})
+    agent.restore(snap)
+    assert len(agent.kb.facts) == facts and not agent.pending_probs
+    agent.release(snap)
+    assert agent.pm._trail is None, "Planner undo log outlived the snapshot"
+    print("test_snapshot_restore passed.")
+
+
+def test_expectimax_lookahead():
+    agent = HybridAgent(Environment(N=4, K=1, seed=1))
+    agent.pm.frontier.clear()
+    facts = len(agent.kb.facts)
+
+    # nearly safe cell that opens up the map: worth the gamble
+    agent.uncertain_cell[(1, 0)] = 0.01
+    goal, route, die_prob = agent.lookahead.choose(agent)
+    assert goal == (1, 0) and route == [(1, 0)] and die_prob == 0.01, f"Unexpected choice {goal}, {route}"
+    assert agent.lookahead.nodes > 0 and agent.lookahead.last_value > 0
+    assert len(agent.kb.facts) == facts and (agent.x, agent.y) == (0, 0), "Lookahead leaked into the agent"
+    assert (1, 0) not in agent.pm.space and agent.uncertain_cell[(1, 0)] == 0.01
+    assert agent.pm._trail is None, "Lookahead left the planner logging every change"
+
+    # coin flip against death: give up without expanding anything
+    agent.uncertain_cell[(1, 0)] = 0.6
+    goal, route, _ = agent.lookahead.choose(agent)
+    assert route is None and agent.lookahead.nodes == 0, f"Should not gamble, got {goal}, {route}"
+
+    # no budget left to expand anything: the good gamble is still taken, not read as giving up
+    agent.uncertain_cell[(1, 0)] = 0.01
+    agent.lookahead.max_nodes = 0
+    goal, route, _ = agent.lookahead.choose(agent)
+    assert goal == (1, 0) and agent.lookahead.nodes == 0, f"Exhausted budget gave up, got {goal}, {route}"
+
+    # ...but unexpanded cells are scored from the priors, not as if surviving found the gold
+    agent.uncertain_cell[(1, 0)] = 0.2
+    goal, route, _ = agent.lookahead.choose(agent)
+    assert route is None and agent.lookahead.nodes == 0, f"Gambled on an unexpanded bound, got {goal}, {route}"
+
+    # the step's own degradation report survives the lookahead
+    agent.lookahead.max_nodes = 12
+    agent.uncertain_cell[(1, 0)] = 0.01
+    agent._degraded = ["planning"]
+    agent.lookahead.choose(agent)
+    assert agent._degraded == ["planning"], f"Lookahead changed the step report: {agent._degraded}"
+    print("test_expectimax_lookahead passed.")
+
+
 def test_add_adj_as_safe_cell():
     agent = init_agent()
     agent.x, agent.y = 2, 2
     agent.cell_prob = {}
-    agent.pm.space = set()
     agent.add_adj_as_safe_cell()
     adj = [(3,2), (1,2), (2,3), (2,1)]
     for cell in adj:
@@ -56,8 +336,11 @@ def test_add_adj_as_safe_cell():
 def test_get_nearest_notvisited_safe_cell():
     agent = init_agent()
     agent.x, agent.y = 0, 0
-    agent.pm.space = {(1,0), (0,1), (2,2)}
+    for cell in [(1,0), (0,1), (2,2)]:
+        agent.pm.add_safe_cell(cell)
     agent.visited = {(0,0), (1,0)}
+    for cell in agent.visited:
+        agent.pm.mark_visited(cell)
     cell = agent.get_nearest_notvisited_safe_cell()
     assert cell == (0,1), f"Expected (0,1), got {cell}"
     print("test_get_nearest_notvisited_safe_cell passed.")
@@ -66,7 +349,8 @@ def test_get_nearest_notvisited_safe_cell():
 def test_find_shoot_path():
     agent = init_agent()
     agent.x, agent.y = 0, 0
-    agent.pm.space = {(0,0), (1,0), (2,0), (2,2)}
+    for cell in [(1,0), (2,0), (2,2)]:
+        agent.pm.add_safe_cell(cell)
     agent.wumpus_at = [(2,0)]
     path = agent.find_shoot_path()
     assert path is not None, "No shoot path found"
@@ -88,7 +372,8 @@ def test_step(agent:HybridAgent):
 def test_find_route_from_A_to_B():
     pm = PlanningModule()
     # Define a simple space: 3x3 grid, all cells are safe
-    pm.space = {(x, y) for x in range(5) for y in range(5)}
+    for cell in [(x, y) for x in range(5) for y in range(5)]:
+        pm.add_safe_cell(cell)
     start = (0, 0)
     goal = (1, 0)
     start_dir = 'E'  # Assume 'E' is a valid direction
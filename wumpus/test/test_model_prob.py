@@ -121,5 +121,17 @@ def test_grounded_rules_pit_prob():
     res = bie.model_check_probability("Pit(2,3)") 
     print(f"Probability of 'Pit(2,3)' being true: {res}")
 
+def test_known_false_symbol_in_rule():
+    kb = KnowledgeBase()
+    ie = InferenceEngine(kb)
+    kb.add_fact("Stench(3,1)")
+    kb.add_fact("!Wumpus(3,2)")
+    kb.add_rule("Stench(3,1) => Wumpus(2,1) | Wumpus(3,2) | Wumpus(3,0)")
+    # Wumpus(3,2) is pinned false, so only Wumpus(2,1) and Wumpus(3,0) are
+    # free: three of their four assignments satisfy the rule.
+    probs = ie.model_check_probabilities(["Wumpus(2,1)", "Wumpus(3,0)", "Wumpus(3,2)"])
+    assert [round(p, 6) for p in probs] == [round(2 / 3, 6), round(2 / 3, 6), 0]
+    print("test_known_false_symbol_in_rule passed.")
+
 if __name__ == "__main__":
     test_grounded_rules_pit_prob()
\ No newline at end of file
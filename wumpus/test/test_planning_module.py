@@ -0,0 +1,158 @@
+from ..ai.planning_module import PlanningModule
+
+
+def init_pm(cells):
+    pm = PlanningModule()
+    for cell in cells:
+        pm.add_safe_cell(cell)
+    return pm
+
+
+def test_route_to_exit_matches_find_route():
+    pm = init_pm([(x, y) for x in range(4) for y in range(4)])
+    for start in [(3, 3), (0, 3), (2, 1)]:
+        for start_dir in ['N', 'E', 'S', 'W']:
+            _, expected = pm.find_route(start, (0, 0), start_dir)
+            route, cost = pm.route_to_exit(start, start_dir)
+            assert cost <= expected, f"Field cost {cost} worse than A* {expected} from {start}"
+            assert route[-1] == (0, 0), f"Route does not end at exit: {route}"
+    print("test_route_to_exit_matches_find_route passed.")
+
+
+def test_route_to_exit_incremental():
+    # corridor (0,0) -> (0,2) -> (2,2), then a shortcut through (1,0)/(2,0)/(2,1)
+    pm = init_pm([(0, 1), (0, 2), (1, 2), (2, 2)])
+    route, cost = pm.route_to_exit((2, 2), 'W')
+    assert route == [(1, 2), (0, 2), (0, 1), (0, 0)], f"Unexpected route {route}"
+    assert cost == 5, f"Expected cost 5, got {cost}"
+
+    for cell in [(1, 0), (2, 0), (2, 1)]:
+        pm.add_safe_cell(cell)
+    route, cost = pm.route_to_exit((2, 2), 'S')
+    assert route == [(2, 1), (2, 0), (1, 0), (0, 0)], f"Unexpected route {route}"
+    assert cost == 5, f"Expected cost 5, got {cost}"
+    print("test_route_to_exit_incremental passed.")
+
+
+def test_route_to_exit_unreachable():
+    pm = init_pm([(2, 2)])
+    route, cost = pm.route_to_exit((2, 2), 'N')
+    assert route is None and cost is None, "Disconnected cell should have no route"
+
+    # a stale field that would bounce between (1,0) and (2,0) forever: the search takes over
+    pm = init_pm([(1, 0), (2, 0)])
+    for cell, heading in list(pm.exit_field):
+        if cell == pm.exit_pos:
+            del pm.exit_field[(cell, heading)]
+        else:
+            pm.exit_field[(cell, heading)] = 5
+    route, _ = pm.route_to_exit((2, 0), 'W')
+    assert route == [(1, 0), (0, 0)], f"Unexpected route {route}"
+    print("test_route_to_exit_unreachable passed.")
+
+
+def test_reset_exit_pos():
+    pm = PlanningModule(exit_pos=(2, 1))
+    pm.add_safe_cell((2, 2))
+    pm.reset()
+    assert pm.space == {(2, 1)} and pm.frontier == {(2, 1)}, f"Unexpected space {pm.space}"
+    pm.add_safe_cell((3, 1))
+    route, cost = pm.route_to_exit((3, 1), 'W')
+    assert route == [(2, 1)] and cost == 1, f"Unexpected route {route}"
+    print("test_reset_exit_pos passed.")
+
+
+def test_nearest_shoot_route():
+    pm = init_pm([(1, 0), (2, 0), (0, 1), (0, 2), (1, 2)])
+    pm.add_wumpus((3, 2))
+    goal, route, wumpus, shoot_dir = pm.get_nearest_shoot_route((0, 0), 'N')
+    assert goal == (0, 2), f"Expected firing position (0,2), got {goal}"
+    assert route == [(0, 1), (0, 2)], f"Unexpected route {route}"
+    assert wumpus == (3, 2) and shoot_dir == 'E', f"Wrong aim {wumpus} {shoot_dir}"
+
+    # a second wumpus in the same row stands in the way of the first one
+    pm.add_wumpus((2, 2))
+    assert pm.firing_positions[(0, 2)] == (2, 2) and pm.firing_positions[(1, 2)] == (2, 2)
+    pm.add_safe_cell((4, 2))
+    assert pm.firing_positions[(4, 2)] == (3, 2), "Aimed past the nearest wumpus"
+    pm.remove_wumpus((2, 2))
+    assert pm.firing_positions[(0, 2)] == (3, 2), "Still aiming at a removed wumpus"
+
+    pm.remove_wumpus((3, 2))
+    goal, route, wumpus, shoot_dir = pm.get_nearest_shoot_route((0, 0), 'N')
+    assert goal == (-1, -1) and route is None, "No wumpus left, no firing position expected"
+    print("test_nearest_shoot_route passed.")
+
+
+def test_version_bump():
+    pm = init_pm([(1, 0), (2, 0)])
+    version = pm.version
+    pm.add_safe_cell((1, 0))  # already known, not a space change
+    assert pm.version == version, "Version bumped without a space change"
+    pm.add_safe_cell((2, 1))
+    assert pm.version == version + 1
+    route, _ = pm.find_route((0, 0), (2, 1), 'E')
+    assert route == [(1, 0), (2, 0), (2, 1)], f"Unexpected route {route}"
+    print("test_version_bump passed.")
+
+
+def test_risky_route_trade_off():
+    pm = init_pm([(1, 0), (2, 0), (3, 0)])
+    # (0,1) is next door but deadly-ish, (3,1) is a few steps away and much safer
+    risky = {(0, 1): 0.5, (3, 1): 0.1, (1, 1): 0.9}
+    goal, route, die_prob = pm.get_risky_route((0, 0), risky, 'E', max_risk=0.8)
+    assert goal == (3, 1) and die_prob == 0.1, f"Expected (3,1), got {goal}"
+    assert route == [(1, 0), (2, 0), (3, 0), (3, 1)], f"Unexpected route {route}"
+    assert (3, 1) not in pm.space, "Risky cells must not leak into the safe space"
+
+    goal, route, _ = pm.get_risky_route((0, 0), {(1, 1): 0.9}, 'E', max_risk=0.8)
+    assert route is None, "Cells above max_risk must be ignored"
+    print("test_risky_route_trade_off passed.")
+
+
+def test_frontier_tracking():
+    pm = init_pm([(1, 0), (0, 1)])
+    pm.mark_visited((0, 0))
+    assert pm.frontier == {(1, 0), (0, 1)}, f"Unexpected frontier {pm.frontier}"
+    goal, route = pm.get_nearest_frontier_route((0, 0), 'E')
+    assert goal == (1, 0) and route == [(1, 0)], f"Expected (1,0), got {goal}"
+
+    pm.mark_visited((1, 0))
+    pm.add_safe_cell((1, 0))  # re-adding a visited cell must not put it back
+    goal, route = pm.get_nearest_frontier_route((1, 0), 'E')
+    assert goal == (0, 1) and route == [(0, 0), (0, 1)], f"Expected (0,1), got {goal} {route}"
+
+    pm.mark_visited((0, 1))
+    goal, route = pm.get_nearest_frontier_route((0, 1), 'N')
+    assert goal == (-1, -1) and route is None, "Empty frontier should yield no route"
+    print("test_frontier_tracking passed.")
+
+
+def test_snapshot_release():
+    pm = init_pm([(1, 0)])
+    outer = pm.snapshot()
+    pm.add_safe_cell((2, 0))
+    inner = pm.snapshot()
+    pm.add_safe_cell((3, 0))
+    pm.restore(inner)
+    pm.release(inner)  # nested in outer, the log is still needed
+    assert pm._trail is not None and (3, 0) not in pm.space
+
+    pm.restore(outer)
+    pm.release(outer)
+    assert pm._trail is None and pm.space == {(0, 0), (1, 0)}, "Undo log kept after the outermost release"
+    pm.add_safe_cell((2, 0))
+    assert pm._trail is None, "Changes logged with no snapshot left"
+    print("test_snapshot_release passed.")
+
+
+if __name__ == "__main__":
+    test_route_to_exit_matches_find_route()
+    test_route_to_exit_incremental()
+    test_route_to_exit_unreachable()
+    test_reset_exit_pos()
+    test_nearest_shoot_route()
+    test_version_bump()
+    test_risky_route_trade_off()
+    test_frontier_tracking()
+    test_snapshot_release()